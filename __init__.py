@@ -13,18 +13,25 @@
 # limitations under the License.
 
 import os
-import subprocess
 import time
-from urllib.parse import quote
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
 
 from mycroft import intent_handler, AdaptIntent
 from mycroft.audio import wait_while_speaking
 from mycroft.skills.common_play_skill import CommonPlaySkill, CPSMatchLevel
 from mycroft.util import get_cache_directory
 
-from .stations.match import match_station_from_utterance, Match
+from .stations.download import MediaDownload
+from .stations.match import match_station_from_utterance, match_stations_from_utterance, Match
+from .stations.parsing import configure_parse_pool, shutdown_parse_pool
+from .stations.probe import cached_audio_info
+from .stations.profiling import profiler
 from .stations.station import create_custom_station, BaseStation, country_defaults, stations
-from .stations.util import contains_html, find_mime_type
+from .stations.station import set_enclosure_policy
+from .stations.util import Coalescer, find_mime_type
+from .stations.vocabulary import Vocabulary, build_vocabulary
 
 
 # Minimum confidence levels
@@ -32,23 +39,56 @@ CONF_EXACT_MATCH = 0.9
 CONF_LIKELY_MATCH = 0.7
 CONF_GENERIC_MATCH = 0.6
 
+# Seconds a resolution started from a Common Play query remains usable
+SPECULATIVE_RESOLUTION_TTL = 30
+# Seconds to wait for the first bytes of a download before playing it anyway
+PROBE_TIMEOUT = 10
+
+SpeculativeResolution = namedtuple('SpeculativeResolution',
+                                   'station future started')
+
 
 class NewsSkill(CommonPlaySkill):
     def __init__(self):
         super().__init__(name="NewsSkill")
         self.now_playing = None
         self.last_station_played = None
-        self.curl = None
+        # Stations of the last multi-station request, if it was one
+        self.last_playlist_played = None
+        self.downloads = []
+        # Set when the current play request is stopped or superseded
+        self.play_cancelled = Event()
+        self.play_cancelled.set()
+        # Background resolution of stations matched by Common Play queries
+        self.resolver = ThreadPoolExecutor(max_workers=4)
+        self.speculative_resolution = None
+        # Shares one resolution between concurrent requests for a station
+        self.resolutions = Coalescer()
+        # Compiled matching resources keyed by language
+        self._vocabularies = {}
+        # Profiling settings last applied, as (enabled, duration)
+        self.profiling_setting = (None, None)
 
     def initialize(self):
         time.sleep(1)
         self.log.debug('Disabling restart intent')
         self.disable_intent('restart_playback')
-        # Longer titles or alternative common names of feeds for searching
-        self.alternate_station_names = self.load_alternate_station_names()
+        self.add_event('play:start', self.handle_cps_play_start)
+        self.add_event('news-skill.profiling', self.handle_profiling_request)
+        # Compile the resources used to match utterances ahead of queries
+        self.log.debug(f'Loaded vocabulary for {self.vocabulary.lang}')
         self.settings_change_callback = self.on_websettings_changed
         self.on_websettings_changed()
 
+    @property
+    def vocabulary(self) -> Vocabulary:
+        """Matching resources for the current language, built on first use."""
+        vocabulary = self._vocabularies.get(self.lang)
+        if vocabulary is None:
+            vocabulary = build_vocabulary(self)
+            self._vocabularies[self.lang] = vocabulary
+        return vocabulary
+
     def load_alternate_station_names(self) -> dict:
         """Load the list of alternate station names from alt.feed.name.value
 
@@ -75,11 +115,67 @@ class NewsSkill(CommonPlaySkill):
         custom_url = self.settings.get("custom_url", "")
         if station_code == "not_set" and len(custom_url) > 0:
             self.log.info("Creating custom News Station from Skill settings.")
+            # Checking the url needs a network request, so keep it off the
+            # settings callback thread.
+            self.resolver.submit(self._create_custom_station, custom_url)
+        # Number of worker processes used to parse feeds, 0 parses inline
+        configure_parse_pool(self._get_int_setting("parse_workers"))
+        # Prefer the smallest rendition of each bulletin on metered links
+        set_enclosure_policy(
+            bool(self.settings.get("prefer_small_downloads", False)),
+            self._get_int_setting("min_bitrate_kbps") or None
+        )
+        # Only apply changes, so profiling switched over the messagebus is
+        # not undone by unrelated settings
+        profiling = (self.settings.get("profiling"),
+                     self.settings.get("profiling_duration"))
+        if profiling != self.profiling_setting:
+            self.profiling_setting = profiling
+            self.set_profiling(bool(profiling[0]), profiling[1])
+
+    def _get_int_setting(self, name: str, default: int = 0) -> int:
+        """Read a whole number setting, which may be blank or invalid."""
+        value = self.settings.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            self.log.warning(f'Ignoring invalid {name} setting: {value!r}')
+            return default
+
+    def handle_profiling_request(self, message):
+        """Switch profiling on or off from a messagebus message.
+
+        Message data:
+            enabled (bool): whether to profile
+            duration (float): optional seconds to profile for
+        """
+        self.set_profiling(bool(message.data.get('enabled')),
+                           message.data.get('duration'))
+
+    def set_profiling(self, enabled: bool, duration: float = None):
+        """Start or stop writing profiles to the skill cache directory."""
+        if enabled:
+            directory = os.path.join(get_cache_directory('NewsSkill'),
+                                     'profiles')
+            profiler.start(directory, float(duration) if duration else None)
+        else:
+            profiler.stop()
+
+    def _create_custom_station(self, custom_url: str):
+        try:
             create_custom_station(custom_url)
+        except Exception as e:
+            self.log.exception(f'Could not create custom station: {repr(e)}')
 
     @intent_handler(AdaptIntent("").one_of("Give", "Latest").require("News"))
     def handle_latest_news(self, message):
         """Adapt intent handler to capture general queries for the latest news."""
+        requested = match_stations_from_utterance(self, message.data['utterance'])
+        if len(requested) > 1:
+            self.handle_playlist_request(requested)
+            return
         match = match_station_from_utterance(self, message.data['utterance'])
         if match and match.station:
             station = match.station
@@ -90,6 +186,10 @@ class NewsSkill(CommonPlaySkill):
     @intent_handler("PlayTheNews.intent")
     def handle_latest_news_alt(self, message):
         """Padatious intent handler to capture short distinct utterances."""
+        requested = match_stations_from_utterance(self, message.data['utterance'])
+        if len(requested) > 1:
+            self.handle_playlist_request(requested)
+            return
         match = match_station_from_utterance(self, message.data['utterance'])
         if match and match.station:
             station = match.station
@@ -100,11 +200,19 @@ class NewsSkill(CommonPlaySkill):
     @intent_handler(AdaptIntent('').require('Restart'))
     def restart_playback(self, message):
         self.log.info('Restarting last station to be played')
-        if self.last_station_played:
+        if self.last_playlist_played:
+            self.handle_playlist_request(self.last_playlist_played)
+        elif self.last_station_played:
             self.handle_play_request(self.last_station_played)
 
     def CPS_start(self, _, data):
         """Handle request from Common Play System to start playback."""
+        if data and data.get('acronyms'):
+            # Play each of the requested news services in turn
+            available = stations.snapshot()
+            self.handle_playlist_request(
+                [available[acronym] for acronym in data['acronyms']])
+            return
         if data and data.get('acronym'):
             # Play the requested news service
             selected_station = stations[data['acronym']]
@@ -112,7 +220,12 @@ class NewsSkill(CommonPlaySkill):
             # Just use the default news feed
             selected_station = self.get_default_station()
         self.handle_play_request(selected_station)
-        
+
+    def handle_cps_play_start(self, message):
+        """Drop any speculative resolution if another skill won the query."""
+        if message.data.get('skill_id') != self.skill_id:
+            self._drop_speculative_resolution()
+
     def CPS_match_query_phrase(self, phrase: str) -> tuple((str, float, dict)):
         """Respond to Common Play Service query requests.
         
@@ -122,9 +235,14 @@ class NewsSkill(CommonPlaySkill):
         Returns:
             Tuple(Name of station, confidence, Station information)
         """
-        if not self.voc_match(phrase.lower(), 'News'):
+        if not self.vocabulary.contains_news(phrase.lower()):
             # The utterance does not contain news vocab. Do not match.
             return None
+        requested = match_stations_from_utterance(self, phrase)
+        if len(requested) > 1:
+            names = ', '.join(station.full_name for station in requested)
+            data = {'acronyms': [station.acronym for station in requested]}
+            return (names, CPSMatchLevel.MULTI_KEY, data)
         match = match_station_from_utterance(self, phrase)
         
         # If no match but utterance contains news, return low confidence level
@@ -140,14 +258,93 @@ class NewsSkill(CommonPlaySkill):
             match_level = CPSMatchLevel.CATEGORY
         else:
             return None
-            
+
+        if match_level in (CPSMatchLevel.EXACT, CPSMatchLevel.ARTIST):
+            # Likely to be selected, so resolve while CPS collects responses
+            self._start_speculative_resolution(match.station)
+
         return (match.station.full_name, match_level, match.station.as_dict())
 
-    def download_media_file(self, url: str) -> str:
+    def _start_speculative_resolution(self, station: BaseStation):
+        """Begin resolving a station in the background before it is played.
+
+        Args:
+            station: Instance of a Station expected to be played next
+        """
+        current = self.speculative_resolution
+        if (current is not None and current.station is station
+                and not self._is_resolution_expired(current)):
+            return
+        self._drop_speculative_resolution()
+        self.log.debug(f'Speculatively resolving {station.acronym}')
+        future = self.resolver.submit(self._resolve_station, station)
+        self.speculative_resolution = SpeculativeResolution(
+            station, future, time.monotonic())
+
+    def _take_speculative_resolution(self, station: BaseStation):
+        """Claim the in-flight resolution for a station if there is one.
+
+        Args:
+            station: Instance of a Station about to be played
+
+        Returns:
+            Future resolving to a (media url, mime type) tuple, or None if
+            no usable speculative resolution exists for the station.
+        """
+        current = self.speculative_resolution
+        self.speculative_resolution = None
+        if current is None:
+            return None
+        if current.station is not station or self._is_resolution_expired(current):
+            current.future.cancel()
+            return None
+        return current.future
+
+    def _drop_speculative_resolution(self):
+        """Discard any speculative resolution that has not been claimed."""
+        current = self.speculative_resolution
+        self.speculative_resolution = None
+        if current is not None:
+            current.future.cancel()
+
+    @staticmethod
+    def _is_resolution_expired(resolution: SpeculativeResolution) -> bool:
+        age = time.monotonic() - resolution.started
+        return age > SPECULATIVE_RESOLUTION_TTL
+
+    def _resolve_station(self, station: BaseStation) -> tuple:
+        """Get the media url and mime type for a station.
+
+        Concurrent requests for the same station share one resolution.
+
+        Args:
+            station: Instance of a Station to be resolved
+
+        Returns:
+            Tuple(media url, mime type)
+        """
+        return self.resolutions.run(station, lambda: self._resolve(station))
+
+    def _resolve(self, station: BaseStation) -> tuple:
+        with profiler.profile(f'media_uri-{station.acronym}'):
+            media_url = station.media_uri
+        self.log.info(f'News media url: {media_url}')
+        # Downloaded files are probed from their first bytes instead
+        mime = find_mime_type(media_url, probe=not self._needs_download(media_url))
+        return media_url, mime
+
+    def download_media_file(self, url: str, name: str = 'stream',
+                            cancelled: Event = None) -> str:
         """Download a media file and return path to the stream.
-        
+
+        Waits for the first bytes to be received so the format of the file
+        is known, available from cached_audio_info, before playback starts.
+        If the play request is cancelled meanwhile, the download is stopped.
+
         Args:
             url (str): media file to download
+            name (str): file name of the stream, unique per queued track
+            cancelled (Event): set when the play request is no longer wanted
 
         Returns:
             stream (str): file path of the audio stream
@@ -155,16 +352,23 @@ class NewsSkill(CommonPlaySkill):
         Raises:
             ValueError if url does not provide a valid audio file
         """
-        stream = '{}/stream'.format(get_cache_directory('NewsSkill'))
+        stream = '{}/{}'.format(get_cache_directory('NewsSkill'), name)
         # (Re)create Fifo
         if os.path.exists(stream):
             os.remove(stream)
         os.mkfifo(stream)
-        self.log.debug('Running curl {}'.format(url))
-        args = ['curl', '-L', quote(url, safe=":/"), '-o', stream]
-        self.curl = subprocess.Popen(args)
-        # Check if downloaded file is actually an error page
-        if contains_html(stream):
+        self.log.debug('Downloading {}'.format(url))
+        download = MediaDownload(url, get_cache_directory('NewsSkill'), stream)
+        self.downloads.append(download)
+        download.start()
+        info = download.wait_for_probe(PROBE_TIMEOUT)
+        if cancelled is not None and cancelled.is_set():
+            download.cancel()
+            return stream
+        # Check if the server refused the file or sent an error page
+        if info is None and (download.error_status or
+                             'html' in (download.content_type or '')):
+            download.cancel()
             raise ValueError('Could not fetch valid audio file.')
         return stream
 
@@ -177,16 +381,17 @@ class NewsSkill(CommonPlaySkill):
         3. NPR News as global default
         """
         station = None
+        available = stations.snapshot()
         station_code = self.settings.get('station', 'not_set')
         custom_url = self.settings.get('custom_url', '')
         if station_code != 'not_set':
-            station = stations[station_code]
+            station = available[station_code]
         elif len(custom_url) > 0:
-            station = stations.get('custom')
+            station = available.get('custom')
         if station is None:
             station = self.get_default_station_by_country()
         if station is None:
-            station = stations['NPR']
+            station = available['NPR']
         return station
 
     def get_default_station_by_country(self) -> BaseStation:
@@ -195,6 +400,7 @@ class NewsSkill(CommonPlaySkill):
         station_code = country_defaults.get(country_code)
         return stations.get(station_code)
 
+    @profiler.profiled('handle_play_request')
     def handle_play_request(self, station: BaseStation = None):
         """Handle request to play a station.
 
@@ -202,10 +408,40 @@ class NewsSkill(CommonPlaySkill):
             station: Instance of a Station to be played
         """
         self.stop()
+        cancelled = Event()
+        self.play_cancelled = cancelled
         # Speak intro while downloading in background
         self.speak_dialog('news', data={"from": station.full_name})
-        self._play_station(station)
+        self._play_station(station, cancelled)
+        if cancelled.is_set():
+            # Stopped, superseded or failed, so there is nothing to restart
+            return
         self.last_station_played = station
+        self.last_playlist_played = None
+        self.enable_intent('restart_playback')
+
+    @profiler.profiled('handle_playlist_request')
+    def handle_playlist_request(self, playlist: list):
+        """Handle request to play several stations one after another.
+
+        All stations are resolved concurrently. Playback starts as soon as
+        the first is ready and the rest are queued in order as they resolve.
+
+        Args:
+            playlist: Stations to be played, in order
+        """
+        self.stop()
+        cancelled = Event()
+        self.play_cancelled = cancelled
+        resolutions = [self.resolver.submit(self._resolve_station, station)
+                       for station in playlist]
+        names = ', '.join(station.full_name for station in playlist)
+        self.speak_dialog('news', data={"from": names})
+        self._play_playlist(playlist, resolutions, cancelled)
+        if cancelled.is_set():
+            return
+        self.last_station_played = playlist[0]
+        self.last_playlist_played = playlist
         self.enable_intent('restart_playback')
 
     @property
@@ -217,68 +453,161 @@ class NewsSkill(CommonPlaySkill):
                 return True
         return False
 
-    def _play_station(self, station: BaseStation):
+    def _play_station(self, station: BaseStation, cancelled: Event):
         """Play the given station using the most appropriate service.
-        
-        Args: 
+
+        Resolving the media url can take some time, so the request is dropped
+        at each step if it has been stopped or superseded in the meantime.
+
+        Args:
             station (Station): Instance of a Station to be played
+            cancelled (Event): set when this play request is no longer wanted
         """
         try:
             self.log.info(f'Playing News feed: {station.full_name}')
-            media_url = station.media_uri
-            self.log.info(f'News media url: {media_url}')
-            mime = find_mime_type(media_url)
+            speculative = self._take_speculative_resolution(station)
+            if speculative is None:
+                media_url, mime = self._resolve_station(station)
+            else:
+                self.log.debug('Using speculative resolution')
+                media_url, mime = speculative.result()
+            if cancelled.is_set():
+                self.log.debug('Play request cancelled after resolving url')
+                return
             # Ensure announcement of station has finished before playing
             wait_while_speaking()
-            # If backend cannot handle https, download the file and provide a local stream.
-            if media_url[:8] == 'https://' and not self.is_https_supported:
-                stream = self.download_media_file(media_url)
-                self.CPS_play((f"file://{stream}", mime))
-            else:
-                self.CPS_play((media_url, mime))
-            self.CPS_send_status(
-                # cast to str for json serialization
-                image=str(station.image_path),
-                artist=station.full_name
-            )
+            if cancelled.is_set():
+                self.log.debug('Play request cancelled before playback')
+                return
+            track = self._get_playable_track(media_url, mime, cancelled=cancelled)
+            if cancelled.is_set():
+                self.log.debug('Play request cancelled while downloading')
+                return
+            self.CPS_play(track)
+            self._send_status(station, media_url)
             self.now_playing = station.full_name
         except ValueError as e:
+            cancelled.set()
             self.speak_dialog("could.not.start.the.news.feed")
             self.log.exception(e)
 
-    def stop_curl_process(self):
-        """Stop any running curl download process."""
-        if self.curl:
+    def _play_playlist(self, playlist: list, resolutions: list, cancelled: Event):
+        """Play resolved stations in order, starting with the first ready.
+
+        Stations that cannot be resolved are skipped.
+
+        Args:
+            playlist: Stations to be played, in order
+            resolutions: Futures resolving to (media url, mime type) tuples
+            cancelled: set when this play request is no longer wanted
+        """
+        started = False
+        for position, (station, resolution) in enumerate(zip(playlist, resolutions)):
+            try:
+                media_url, mime = resolution.result()
+                if cancelled.is_set():
+                    break
+                track = self._get_playable_track(media_url, mime,
+                                                 f'stream-{position}', cancelled)
+            except Exception as e:
+                self.log.exception(f'Skipping {station.full_name}: {repr(e)}')
+                continue
+            if cancelled.is_set():
+                break
+            if started:
+                self.log.info(f'Queueing News feed: {station.full_name}')
+                self.audioservice.queue([track])
+                continue
+            wait_while_speaking()
+            if cancelled.is_set():
+                break
+            self.log.info(f'Playing News feed: {station.full_name}')
+            self.CPS_play(track)
+            self._send_status(station, media_url)
+            self.now_playing = station.full_name
+            started = True
+        if cancelled.is_set():
+            self.log.debug('Playlist request cancelled')
+            for resolution in resolutions:
+                resolution.cancel()
+        elif not started:
+            cancelled.set()
+            self.speak_dialog("could.not.start.the.news.feed")
+
+    def _send_status(self, station: BaseStation, media_url: str):
+        """Report the playing station, with its duration if it was probed."""
+        status = dict(
+            # cast to str for json serialization
+            image=str(station.image_path),
+            artist=station.full_name
+        )
+        info = cached_audio_info(media_url)
+        if info is not None and info.duration:
             try:
-                self.curl.terminate()
-                self.curl.communicate()
-                # Check if process has completed
-                return_code = self.curl.poll()
-                if return_code is None:
-                    # Process must still be running...
-                    self.curl.kill()
-                else:
-                    self.log.debug(f'Curl return code: {return_code}')
-            except subprocess.SubprocessError as e:
-                self.log.exception(f'Could not stop curl: {repr(e)}')
-            finally:
-                self.curl = None
+                self.CPS_send_status(track_length=info.duration * 1000,
+                                     **status)
+                return
+            except TypeError:
+                # Older Common Play versions do not report a track length
+                pass
+        self.CPS_send_status(**status)
+
+    def _get_playable_track(self, media_url: str, mime: str,
+                            stream_name: str = 'stream',
+                            cancelled: Event = None) -> tuple:
+        """Get a track the audio backend can play for a media url.
+
+        If the backend cannot handle https, the file is downloaded and a
+        local stream is provided instead. Callers must check cancelled
+        again afterwards, as the download may have been stopped.
+
+        Returns:
+            Tuple(uri, mime type)
+        """
+        if self._needs_download(media_url):
+            stream = self.download_media_file(media_url, stream_name, cancelled)
+            info = cached_audio_info(media_url)
+            return (f"file://{stream}", info.mime if info else mime)
+        return (media_url, mime)
+
+    def _needs_download(self, media_url: str) -> bool:
+        """Check if the audio backend needs a local copy of a media url."""
+        return media_url[:8] == 'https://' and not self.is_https_supported
+
+    def stop_download(self):
+        """Stop any running media downloads without waiting for them."""
+        downloads, self.downloads = self.downloads, []
+        for download in downloads:
+            download.cancel()
 
     def stop(self) -> bool:
-        """Respond to system stop commands."""
-        if self.now_playing is None:
+        """Respond to system stop commands.
+
+        Cancels any play request that is still being resolved as well as
+        active playback.
+        """
+        resolving = not self.play_cancelled.is_set()
+        self.play_cancelled.set()
+        if self.now_playing is None and not resolving:
             return False
         self.now_playing = None
         # Disable restarting when stopped
         if self.last_station_played:
             self.disable_intent('restart_playback')
             self.last_station_played = None
+            self.last_playlist_played = None
 
-        # Stop download process if it's running.
-        self.stop_curl_process()
+        # Stop download if it's running.
+        self.stop_download()
         self.CPS_send_status()
         return True
 
+    def shutdown(self):
+        self._drop_speculative_resolution()
+        self.resolver.shutdown(wait=False)
+        shutdown_parse_pool()
+        super().shutdown()
+
 
 def create_skill():
     return NewsSkill()
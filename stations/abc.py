@@ -12,23 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from urllib.request import urlopen
-
 from bs4 import BeautifulSoup
 
+from .parsing import run_parser
+from .util import fetch
+
+
 def get_abc_url():
     """Custom news scraper for ABC News Australia briefing.
     
     Scrapes the News Briefings overview page to find the latest episode."""
     domain = "https://www.abc.net.au"
     latest_briefings_url = f"{domain}/radio/newsradio/news-briefings/"
-    soup = BeautifulSoup(urlopen(latest_briefings_url), features='html.parser')
+    page = fetch(latest_briefings_url)
+    episode_page_link = run_parser(_parse_episode_link, page)
+    episode_page = fetch(domain + episode_page_link)
+    mp3_url = run_parser(_parse_download_link, episode_page)
+    return mp3_url
+
+
+def _parse_episode_link(page: bytes) -> str:
+    """Find the link to the latest episode on the News Briefings page."""
+    soup = BeautifulSoup(page, features='html.parser')
     # The collection-grid3 element contains a list of the latest episodes
     result = soup.find(id="collection-grid3")
     # Get the href value of the first link tag from within this list
-    episode_page_link = result.find_all('a')[0]['href']
-    episode_page = urlopen(domain + episode_page_link)
-    episode_soup = BeautifulSoup(episode_page, features='html.parser')
-    mp3_url = episode_soup.find_all(attrs={"data-component": "DownloadButton"})[0]['href']
-    return mp3_url
+    return result.find_all('a')[0]['href']
+
+
+def _parse_download_link(page: bytes) -> str:
+    """Find the mp3 download link on an episode page."""
+    soup = BeautifulSoup(page, features='html.parser')
+    return soup.find_all(attrs={"data-component": "DownloadButton"})[0]['href']
 
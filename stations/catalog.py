@@ -0,0 +1,125 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Declarative catalog of the available stations.
+
+Each entry of catalog.json describes one station:
+
+    acronym    unique short name, also used in settings
+    name       full name of the station
+    type       "rss", "file", "template" or "fetcher"
+    source     feed url, media url, strftime url template, or the dotted
+               path of a getter function relative to this package
+    image      logo file in the images directory (optional)
+    ttl        seconds a fetched feed may be reused (optional)
+    cadence    minutes between new bulletins, as a hint (optional)
+    countries  country codes the station is the default for (optional)
+    aliases    extra names the station is known by (optional)
+"""
+
+import json
+from collections import namedtuple
+from importlib import import_module
+from pathlib import Path
+
+CATALOG_FILE = Path(__file__).with_name('catalog.json')
+
+STATION_TYPES = ('rss', 'file', 'template', 'fetcher')
+
+CatalogEntry = namedtuple(
+    'CatalogEntry',
+    ['acronym', 'full_name', 'type', 'source', 'image_file', 'ttl',
+     'cadence', 'aliases']
+)
+
+
+class Catalog:
+    """Station entries with lookup indexes built once when loaded.
+
+    Args:
+        entries: CatalogEntry for each station in catalog order
+        country_defaults: acronym of the default station keyed by country
+    """
+
+    def __init__(self, entries: tuple, country_defaults: dict):
+        self.entries = entries
+        self.by_acronym = {entry.acronym: entry for entry in entries}
+        self.country_defaults = country_defaults
+        self.aliases = {entry.acronym: list(entry.aliases)
+                        for entry in entries if entry.aliases}
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, acronym: str) -> CatalogEntry:
+        return self.by_acronym.get(acronym)
+
+    def default_for(self, country_code: str) -> CatalogEntry:
+        """Get the default station entry for a country, if there is one."""
+        return self.by_acronym.get(self.country_defaults.get(country_code))
+
+
+def parse_catalog(data: dict) -> Catalog:
+    """Build a Catalog from the decoded contents of a catalog file.
+
+    Raises:
+        ValueError if an entry is incomplete, duplicated or of unknown type
+    """
+    entries = []
+    country_defaults = {}
+    seen = set()
+    for item in data.get('stations', []):
+        try:
+            entry = CatalogEntry(
+                acronym=item['acronym'],
+                full_name=item['name'],
+                type=item['type'],
+                source=item['source'],
+                image_file=item.get('image'),
+                ttl=item.get('ttl', 0),
+                cadence=item.get('cadence'),
+                aliases=tuple(alias.lower() for alias in item.get('aliases', ())),
+            )
+        except KeyError as e:
+            raise ValueError(f'Station catalog entry is missing {e}: {item}')
+        if entry.type not in STATION_TYPES:
+            raise ValueError(f'Unknown station type {entry.type} for {entry.acronym}')
+        if entry.acronym in seen:
+            raise ValueError(f'Station {entry.acronym} is listed more than once')
+        seen.add(entry.acronym)
+        entries.append(entry)
+        for country_code in item.get('countries', ()):
+            if country_code in country_defaults:
+                raise ValueError(f'Country {country_code} has more than one default')
+            country_defaults[country_code] = entry.acronym
+    return Catalog(tuple(entries), country_defaults)
+
+
+def load_catalog(path: Path = CATALOG_FILE) -> Catalog:
+    """Read and index a station catalog file."""
+    with open(path, encoding='utf-8') as catalog_file:
+        return parse_catalog(json.load(catalog_file))
+
+
+def import_getter(dotted_path: str):
+    """Import a getter function given its dotted path.
+
+    Paths starting with a dot are relative to this package, so the catalog
+    does not depend on the name the skill is installed under.
+    """
+    module_name, _, attribute = dotted_path.rpartition('.')
+    module = import_module(module_name, package=__package__)
+    return getattr(module, attribute)
@@ -0,0 +1,362 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Resumable download of media files for backends that cannot fetch them."""
+
+import json
+import os
+from hashlib import sha1
+from pathlib import Path
+from threading import Event, Lock, Thread
+
+import requests
+from mycroft.util import LOG
+
+from .probe import AudioInfo, probe_audio, remember_audio_info
+from .util import rate_limiter, total_length
+
+CHUNK_SIZE = 16 * 1024
+# Seconds to wait for a connection, and between bytes of the response
+TIMEOUT = (5, 10)
+# Attempts to resume an interrupted download before giving up
+MAX_RETRIES = 5
+# Number of partially or fully downloaded files kept in the cache
+CACHED_DOWNLOADS = 3
+# Seconds to wait for an earlier download of the same url to finish
+PREVIOUS_DOWNLOAD_TIMEOUT = 5
+# Errors after which the download is resumed, HTTPError only for 5xx
+RETRIED_ERRORS = (requests.ConnectionError, requests.Timeout,
+                  requests.exceptions.ChunkedEncodingError, requests.HTTPError)
+
+# Downloads that are running, so their cache files are left alone
+_active_downloads = []
+_active_lock = Lock()
+
+
+class MediaDownload:
+    """Download a media file into the cache while streaming it to a fifo.
+
+    Bytes are kept in a .part file next to the validators (ETag or
+    Last-Modified) the server sent with them. If the connection drops the
+    download resumes from the last byte received using a Range request
+    guarded by If-Range. A later download of the same url revalidates the
+    cached bytes with the server before replaying them, then requests only
+    the remainder. A changed file replaces the cache.
+
+    The stream is only opened once the first bytes have been received, so
+    the format of the file can be probed from them before playback starts.
+
+    Downloads of the same url share their cache files, so a download waits
+    for any earlier one of that url to finish first.
+    """
+
+    def __init__(self, url: str, cache_dir: str, stream: str):
+        self.url = url
+        self.stream = stream
+        key = sha1(url.encode()).hexdigest()
+        self.part_file = Path(cache_dir, f'{key}.part')
+        self.meta_file = Path(cache_dir, f'{key}.json')
+        self._meta = {}
+        # Number of bytes written to the stream so far
+        self._offset = 0
+        # Number of cached bytes not yet confirmed current and streamed
+        self._cached = 0
+        # Probe of the first bytes, and the content type they were sent as
+        self.audio_info = None
+        self.content_type = None
+        # Status of a client error response refusing the download
+        self.error_status = None
+        self._probed = Event()
+        self._cancelled = Event()
+        self._previous = []
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        with _active_lock:
+            self._previous = [download for download in _active_downloads
+                              if download.part_file == self.part_file]
+            _active_downloads.append(self)
+        self._thread.start()
+
+    def cancel(self):
+        """Stop the download without waiting for it to finish."""
+        self._cancelled.set()
+        # Nothing more will be probed, release anyone waiting for it
+        self._probed.set()
+        # Opening the fifo for reading releases a writer waiting on a reader
+        try:
+            os.close(os.open(self.stream, os.O_RDONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def wait_for_probe(self, timeout: float) -> AudioInfo:
+        """Wait for the first bytes of the file to be received and probed.
+
+        Returns:
+            AudioInfo, or None if the bytes are not known audio or did not
+            arrive in time
+        """
+        self._probed.wait(timeout)
+        return self.audio_info
+
+    def _run(self):
+        out = _LazyStream(self.stream)
+        try:
+            self._wait_for_previous()
+            self._prune_cache()
+            self._download(out)
+            self._probed.set()
+            if not self.cancelled:
+                # Open the stream even if nothing was written, so a reader
+                # waiting on it sees the end of the file
+                out.open()
+        except BrokenPipeError:
+            LOG.debug('Media stream closed by the audio backend')
+        except OSError as e:
+            LOG.exception(f'Could not stream {self.url}: {repr(e)}')
+        finally:
+            self._probed.set()
+            out.close()
+            with _active_lock:
+                _active_downloads.remove(self)
+
+    def _wait_for_previous(self):
+        """Let earlier downloads of the url finish with the cache files.
+
+        One still running after the timeout, for example a long file being
+        played, keeps them and this download uses its own files instead.
+        """
+        for previous in self._previous:
+            previous._thread.join(PREVIOUS_DOWNLOAD_TIMEOUT)
+            if previous._thread.is_alive():
+                LOG.info(f'{self.url} is still being downloaded, '
+                         'not sharing its cache')
+                key = f'{self.part_file.stem}-{id(self):x}'
+                self.part_file = self.part_file.with_name(f'{key}.part')
+                self.meta_file = self.meta_file.with_name(f'{key}.json')
+                break
+        self._previous = []
+
+    def _download(self, out):
+        """Check any cached bytes are current, then fetch the rest with retries."""
+        self._meta = self._load_meta() if self.part_file.exists() else {}
+        if _validator(self._meta):
+            self._cached = self.part_file.stat().st_size
+        else:
+            self._discard_cache()
+        attempts = 0
+        while not self.cancelled:
+            try:
+                if not self._fetch(out):
+                    return
+            except RETRIED_ERRORS as e:
+                attempts += 1
+                if attempts > MAX_RETRIES:
+                    LOG.error(f'Giving up on {self.url}: {repr(e)}')
+                    return
+                LOG.info(f'Download interrupted at byte {self._offset}, '
+                         'resuming')
+                self._cancelled.wait(min(2 ** attempts, 10))
+            except requests.RequestException as e:
+                LOG.error(f'Could not download {self.url}: {repr(e)}')
+                return
+
+    def _fetch(self, out) -> bool:
+        """Make one request for the bytes not yet received.
+
+        The first request of a play also revalidates the cache. A complete
+        file is requested conditionally and a partial one with If-Range, so
+        cached bytes are only streamed once the server has confirmed they
+        are current. Otherwise they are discarded for the fresh response.
+
+        Returns:
+            Whether the download is still incomplete and could continue.
+        """
+        headers = {}
+        validator = _validator(self._meta)
+        received = self._offset + self._cached
+        if self._cached and self._meta.get('complete'):
+            if self._meta.get('etag'):
+                headers['If-None-Match'] = self._meta['etag']
+            if self._meta.get('last_modified'):
+                headers['If-Modified-Since'] = self._meta['last_modified']
+        elif received and validator:
+            headers['Range'] = f'bytes={received}-'
+            headers['If-Range'] = validator
+        rate_limiter.wait(self.url)
+        with requests.get(self.url, headers=headers, stream=True,
+                          timeout=TIMEOUT) as response:
+            if response.status_code in (304, 416):
+                # Nothing changed, or nothing left to fetch
+                self._replay_cache(out, self._cached)
+                self._mark_complete()
+                LOG.debug(f'Played {self.url} from cache')
+                return False
+            if 400 <= response.status_code < 500:
+                # Retrying will not help, and the body is not the file
+                LOG.error(f'Could not download {self.url}: '
+                          f'status {response.status_code}')
+                self.error_status = response.status_code
+                self.content_type = response.headers.get('Content-Type')
+                self._probed.set()
+                return False
+            response.raise_for_status()
+            total = total_length(response)
+            skip = 0
+            if response.status_code == 200:
+                fresh = self._validators(response)
+                if self._offset:
+                    if _validator(fresh) != validator:
+                        LOG.info(f'{self.url} changed during download, stopping')
+                        self._discard_cache()
+                        return False
+                    # The whole file was sent, skip the bytes already streamed
+                    skip = self._offset
+                elif self._cached:
+                    LOG.debug(f'{self.url} has changed, discarding cache')
+                    self._discard_cache()
+                self._meta = fresh
+                self._save_meta()
+            else:
+                self._replay_cache(out, total)
+            with open(self.part_file, 'ab' if self._offset else 'wb') as part:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self.cancelled:
+                        return False
+                    if skip:
+                        if len(chunk) <= skip:
+                            skip -= len(chunk)
+                            continue
+                        chunk, skip = chunk[skip:], 0
+                    if self._offset == 0:
+                        self._probe(chunk, total, response.headers.get('Content-Type'))
+                    part.write(chunk)
+                    out.write(chunk)
+                    self._offset += len(chunk)
+        self._mark_complete()
+        return False
+
+    def _probe(self, head: bytes, total: int, content_type: str = None):
+        """Learn the format and duration from the first chunk received."""
+        self.audio_info = probe_audio(head, total)
+        self.content_type = content_type
+        remember_audio_info(self.url, self.audio_info)
+        self._probed.set()
+
+    def _mark_complete(self):
+        self._meta['complete'] = True
+        self._save_meta()
+
+    def _replay_cache(self, out, total: int):
+        """Write previously downloaded bytes to the stream."""
+        if not self._cached:
+            return
+        try:
+            with open(self.part_file, 'rb') as part:
+                for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+                    if self.cancelled:
+                        break
+                    if self._offset == 0:
+                        self._probe(chunk, total, self._meta.get('content_type'))
+                    out.write(chunk)
+                    self._offset += len(chunk)
+        except FileNotFoundError:
+            pass
+        self._cached = 0
+
+    def _discard_cache(self):
+        """Forget cached bytes that no longer match the remote file."""
+        self.part_file.unlink(missing_ok=True)
+        self.meta_file.unlink(missing_ok=True)
+        self._meta = {}
+        self._cached = 0
+
+    @staticmethod
+    def _validators(response) -> dict:
+        meta = {'content_type': response.headers.get('Content-Type')}
+        if response.headers.get('ETag'):
+            meta['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            meta['last_modified'] = response.headers['Last-Modified']
+        return meta
+
+    def _load_meta(self) -> dict:
+        try:
+            with open(self.meta_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self):
+        with open(self.meta_file, 'w') as f:
+            json.dump(self._meta, f)
+
+    def _prune_cache(self):
+        """Remove all but the most recently used downloads.
+
+        Files of running downloads are kept, and files removed by another
+        download meanwhile are skipped.
+        """
+        with _active_lock:
+            active = {download.part_file for download in _active_downloads}
+        parts = []
+        for part in self.part_file.parent.glob('*.part'):
+            try:
+                parts.append((part.stat().st_mtime, part))
+            except FileNotFoundError:
+                continue
+        parts.sort(reverse=True)
+        others = [part for _, part in parts if part not in active]
+        for part in others[CACHED_DOWNLOADS - 1:]:
+            part.unlink(missing_ok=True)
+            part.with_suffix('.json').unlink(missing_ok=True)
+        try:
+            # Mark as recently used
+            os.utime(self.part_file)
+        except FileNotFoundError:
+            pass
+
+
+def _validator(meta: dict) -> str:
+    """Get the value to send as If-Range, preferring the ETag."""
+    return meta.get('etag') or meta.get('last_modified')
+
+
+class _LazyStream:
+    """Output file that is only opened when first written to.
+
+    Opening a fifo for writing blocks until it has a reader.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+
+    def write(self, data: bytes):
+        self.open()
+        self._file.write(data)
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except BrokenPipeError:
+                pass
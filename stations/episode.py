@@ -0,0 +1,194 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact records of the episodes published in a news feed."""
+
+from calendar import timegm
+from collections import namedtuple
+
+import feedparser
+
+# How to choose between alternative renditions of the same bulletin.
+#   prefer_smallest: pick the lowest bitrate rendition rather than the first
+#   min_bitrate: quality floor in kbps that a smaller rendition must meet
+SelectionPolicy = namedtuple('SelectionPolicy', 'prefer_smallest min_bitrate')
+DEFAULT_POLICY = SelectionPolicy(prefer_smallest=False, min_bitrate=None)
+
+
+class Enclosure:
+    """One rendition of a bulletin as declared by the feed."""
+    __slots__ = ('url', 'mime', 'length', 'bitrate')
+
+    def __init__(self, url: str, mime: str = None, length: int = None,
+                 bitrate: int = None):
+        self.url = url
+        self.mime = mime
+        self.length = length
+        # Declared bitrate in kbps
+        self.bitrate = bitrate
+
+    def __repr__(self):
+        return f'Enclosure({self.url!r}, {self.mime!r})'
+
+
+class Episode:
+    """A single bulletin from a news feed.
+
+    Only the details needed for playback are kept so that the full feed can
+    be released as soon as it has been parsed. The first enclosure is the
+    one the feed lists first, preferring audio.
+    """
+    __slots__ = ('enclosures', 'published', 'title', 'duration')
+
+    def __init__(self, enclosures: tuple, published: float = None,
+                 title: str = None, duration: int = None):
+        self.enclosures = enclosures
+        self.published = published
+        self.title = title
+        self.duration = duration
+
+    @property
+    def url(self) -> str:
+        return self.enclosures[0].url
+
+    @property
+    def mime(self) -> str:
+        return self.enclosures[0].mime
+
+    @property
+    def length(self) -> int:
+        return self.enclosures[0].length
+
+    def select_enclosure(self, policy: SelectionPolicy) -> Enclosure:
+        """Choose the rendition to play according to a selection policy."""
+        return select_enclosure(self.enclosures, policy, self.duration)
+
+    def __repr__(self):
+        return f'Episode({self.title!r}, {self.url!r})'
+
+
+def select_enclosure(enclosures: list, policy: SelectionPolicy,
+                     duration: int = None) -> Enclosure:
+    """Choose a rendition of a bulletin using the declared metadata.
+
+    When preferring small downloads, the lowest bitrate rendition that meets
+    the quality floor is chosen. Bitrates are estimated from the length and
+    duration where they are not declared. If no rendition meets the floor
+    the highest bitrate one is used. Renditions with no usable metadata are
+    only chosen if nothing else is known.
+
+    Args:
+        enclosures: alternative renditions, in feed order
+        policy: how to choose between the renditions
+        duration: length of the bulletin in seconds if known
+
+    Returns:
+        The selected Enclosure
+    """
+    if not policy.prefer_smallest or len(enclosures) < 2:
+        return enclosures[0]
+    rated = []
+    for enclosure in enclosures:
+        bitrate = _estimate_bitrate(enclosure, duration)
+        if bitrate is not None:
+            rated.append((bitrate, enclosure))
+    if not rated:
+        # Fall back on the smallest declared file size
+        sized = [e for e in enclosures if e.length]
+        return min(sized, key=lambda e: e.length) if sized else enclosures[0]
+    floor = policy.min_bitrate or 0
+    acceptable = [r for r in rated if r[0] >= floor]
+    if acceptable:
+        return min(acceptable, key=lambda r: r[0])[1]
+    return max(rated, key=lambda r: r[0])[1]
+
+
+def _estimate_bitrate(enclosure: Enclosure, duration: int) -> float:
+    """Get the declared bitrate or derive it from the length in kbps."""
+    if enclosure.bitrate:
+        return enclosure.bitrate
+    if enclosure.length and duration:
+        return enclosure.length * 8 / duration / 1000
+    return None
+
+
+def parse_episodes(raw_feed: bytes, limit: int) -> list:
+    """Extract the latest episodes from the raw content of an RSS feed.
+
+    For each entry, collects every audio enclosure and media:content
+    rendition, or falls back to the first href link in the entry if no
+    explicit audio can be found.
+
+    Args:
+        raw_feed: RSS document to parse
+        limit: maximum number of episodes to return
+
+    Returns:
+        List of Episodes, newest first as ordered in the feed.
+    """
+    episodes = []
+    for entry in feedparser.parse(raw_feed).entries[:limit]:
+        enclosures = _collect_enclosures(entry)
+        if not enclosures:
+            continue
+        published = entry.get('published_parsed')
+        episodes.append(Episode(
+            enclosures=enclosures,
+            published=timegm(published) if published else None,
+            title=entry.get('title'),
+            duration=_parse_duration(entry.get('itunes_duration')),
+        ))
+    return episodes
+
+
+def _collect_enclosures(entry: dict) -> tuple:
+    """Get all audio renditions of an entry, or its first link of any kind."""
+    enclosures = []
+    seen = set()
+    for link in entry.get('links', []):
+        if 'audio' in link.get('type', '') and link['href'] not in seen:
+            seen.add(link['href'])
+            enclosures.append(Enclosure(link['href'], link['type'],
+                                        _parse_int(link.get('length'))))
+    for media in entry.get('media_content', []):
+        url = media.get('url')
+        if url and 'audio' in media.get('type', '') and url not in seen:
+            seen.add(url)
+            enclosures.append(Enclosure(url, media['type'],
+                                        _parse_int(media.get('filesize')),
+                                        _parse_int(media.get('bitrate'))))
+    if not enclosures and entry.get('links'):
+        link = entry['links'][0]
+        enclosures.append(Enclosure(link['href'], link.get('type'),
+                                    _parse_int(link.get('length'))))
+    return tuple(enclosures)
+
+
+def _parse_int(value: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_duration(value: str) -> int:
+    """Convert an itunes:duration of [[HH:]MM:]SS into seconds."""
+    if not value:
+        return None
+    seconds = 0
+    try:
+        for part in value.split(':'):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return None
+    return seconds
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 from bs4 import BeautifulSoup
-from urllib.request import urlopen
+
+from .parsing import run_parser
+from .util import fetch
 
 
 def get_ft_url():
@@ -21,15 +23,24 @@ def get_ft_url():
     
     Fetches latest episode link from FT website."""
     url = 'https://www.ft.com/newsbriefing'
-    page = urlopen(url)
+    page = fetch(url)
+
+    target_url = 'http://www.ft.com' + run_parser(_parse_episode_path, page)
+    mp3_page = fetch(target_url)
+    mp3_url = run_parser(_parse_source_link, mp3_page)
+
+    return mp3_url
 
-    # Use bs4 to parse website and get mp3 link
+
+def _parse_episode_path(page: bytes) -> str:
+    """Use bs4 to find the path of the latest episode page."""
     soup = BeautifulSoup(page, features='html.parser')
     result = soup.find('time')
     target_div = result.parent.find_next('div')
-    target_url = 'http://www.ft.com' + target_div.a['href']
-    mp3_page = urlopen(target_url)
-    mp3_soup = BeautifulSoup(mp3_page, features='html.parser')
-    mp3_url = mp3_soup.find('source')['src']
+    return target_div.a['href']
+
 
-    return mp3_url
\ No newline at end of file
+def _parse_source_link(page: bytes) -> str:
+    """Use bs4 to find the mp3 link on an episode page."""
+    soup = BeautifulSoup(page, features='html.parser')
+    return soup.find('source')['src']
@@ -15,7 +15,10 @@
 import re
 
 import feedparser
-import requests
+
+from .parsing import run_parser
+from .util import fetch
+
 
 def get_gpb_url():
     """Custom news fetcher for GPB news.
@@ -23,19 +26,23 @@ def get_gpb_url():
     Uses an RSS feed with a mixture of content. This fetches the latest 
     headlines episode."""
     feed = 'http://feeds.feedburner.com/gpbnews/GeorgiaRSS?format=xml'
-    data = feedparser.parse(feed)
-    next_link = None
-    for entry in data['entries']:
-        # Find the first mp3 link with "GPB {time} Headlines" in title
-        if 'GPB' in entry['title'] and 'Headlines' in entry['title']:
-            next_link = entry['links'][0]['href']
-            break
-    html = requests.get(next_link)
+    next_link = run_parser(_parse_headlines_link, fetch(feed))
+    html = fetch(next_link)
     # Find the first mp3 link
     # Note that the latest mp3 may not be news,
     # but could be an interview, etc.
-    mp3_find = re.search(r'href="(?P<mp3>.+\.mp3)"'.encode(), html.content)
+    mp3_find = re.search(r'href="(?P<mp3>.+\.mp3)"'.encode(), html)
     if mp3_find is None:
         return None
     url = mp3_find.group('mp3').decode('utf-8')
-    return url
\ No newline at end of file
+    return url
+
+
+def _parse_headlines_link(raw_feed: bytes) -> str:
+    """Find the latest headlines episode in the GPB feed."""
+    data = feedparser.parse(raw_feed)
+    for entry in data['entries']:
+        # Find the first mp3 link with "GPB {time} Headlines" in title
+        if 'GPB' in entry['title'] and 'Headlines' in entry['title']:
+            return entry['links'][0]['href']
+    return None
@@ -17,6 +17,7 @@ from collections import namedtuple
 from mycroft.util import LOG
 from mycroft.util.parse import fuzzy_match
 
+from .profiling import profiler
 from .station import stations
 
 
@@ -69,6 +70,7 @@ def match_station_name(phrase, station, aliases, news_keyword):
     return Match(station, highest_confidence)
 
 
+@profiler.profiled('match_station_from_utterance')
 def match_station_from_utterance(skill, utterance):
     """Get the expected station from a user utterance.
     
@@ -77,31 +79,58 @@ def match_station_from_utterance(skill, utterance):
     """
     match = Match(None, 0.0)
 
-    utterance = utterance.lower().strip()
-    # Remove articles like "the" as it matches too well with "other"
-    word_list = utterance.split(' ')
-    if 'the' in word_list:
-        word_list.remove('the')
-    utterance = ' '.join(word_list)
+    utterance = _normalise_utterance(utterance)
 
     # If news vocab does exist, provide a minimum default confidence
     default_station = skill.get_default_station()
     match = Match(default_station, CONF_GENERIC_MATCH)
 
     # Catch any short explicit phrases eg 'play the news'
-    news_phrases = skill.translate_list("PlayTheNews") or []
-    if utterance in news_phrases:
+    vocabulary = skill.vocabulary
+    if utterance in vocabulary.news_phrases:
         LOG.debug("Explicit phrase without specific station detected.")
         return Match(default_station, 1.0)
 
     # Test against each station to find the best match.
-    news_keyword = skill.translate('OnlyNews').lower()
     LOG.debug("Matching against specific stations")
-    for station in stations.values():
-        aliases = skill.alternate_station_names.get(station.acronym)
-        station_match = match_station_name(utterance, station, aliases, news_keyword)
+    for station in stations.snapshot().values():
+        aliases = vocabulary.station_aliases.get(station.acronym)
+        station_match = match_station_name(utterance, station, aliases,
+                                           vocabulary.news_keyword)
         LOG.debug(f"{station.acronym}: {match.confidence}")
         if station_match.confidence > match.confidence:
             match = station_match
 
-    return match
\ No newline at end of file
+    return match
+
+
+def match_stations_from_utterance(skill, utterance):
+    """Get every station that was explicitly requested in a user utterance.
+
+    A station must be named in the utterance as whole words, by acronym,
+    full name or alias. Each mention stands on its own, so a station named
+    alongside others is not penalised for the rest of the utterance, while
+    similar names such as "BBC" and "CBC" are still told apart.
+
+    Returns:
+        List of Stations in the order they were mentioned.
+    """
+    utterance = _normalise_utterance(utterance)
+    vocabulary = skill.vocabulary
+    mentioned = []
+    for station in stations.snapshot().values():
+        mention = vocabulary.mention_pattern(station).search(utterance)
+        if mention is not None:
+            mentioned.append((mention.start(), station))
+    mentioned.sort(key=lambda mention: mention[0])
+    return [station for _, station in mentioned]
+
+
+def _normalise_utterance(utterance):
+    utterance = utterance.lower().strip()
+    # Remove articles like "the" as it matches too well with "other"
+    word_list = utterance.split(' ')
+    if 'the' in word_list:
+        word_list.remove('the')
+    return ' '.join(word_list)
+
@@ -0,0 +1,42 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Prepare a parsing worker process so it can import the parsers.
+
+This file is run by path at the start of each worker, before any parser is
+unpickled, so it must not depend on the package it makes importable.
+"""
+
+import sys
+from pathlib import Path
+from types import ModuleType
+
+
+def register_package(package: str, package_dir: str):
+    """Make a package importable by the name it has in the skill process.
+
+    The skill directory is often not a valid module name and importing it
+    would load the whole skill, so a bare parent package stands in for it.
+    """
+    parent, _, _ = package.rpartition('.')
+    parent_dir = str(Path(package_dir).parent)
+    if not parent:
+        sys.path.insert(0, parent_dir)
+    elif parent not in sys.modules:
+        module = ModuleType(parent)
+        module.__path__ = [parent_dir]
+        sys.modules[parent] = module
+
+
+if __name__ == '__parse_worker__':
+    register_package(PACKAGE, PACKAGE_DIR)  # noqa: F821 - set by runpy
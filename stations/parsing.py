@@ -0,0 +1,104 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Optional worker pool for the CPU bound parsing of feeds and web pages.
+
+Fetchers download the raw bytes themselves and hand them to run_parser along
+with a module level parsing function. By default the parser runs inline. Once
+a pool has been configured it runs in a separate process instead, so the
+parse does not hold the GIL of the skill process.
+
+The skill process runs many threads, and forking it could leave a worker
+holding a copy of a lock that is never released. Workers are therefore
+started from a fresh interpreter, using a fork server where available.
+Parsers must be module level functions of this package, as the worker
+imports them by name, and the skill's main module must be safe to import.
+"""
+
+import multiprocessing
+import runpy
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from threading import Lock
+
+from mycroft.util import LOG
+
+
+# Run in each worker to make the parsers importable, see parse_worker.py
+WORKER_SETUP = Path(__file__).with_name('parse_worker.py')
+
+_pool = None
+_pool_workers = 0
+_pool_lock = Lock()
+
+
+def configure_parse_pool(workers: int = 0):
+    """Start or stop the parsing worker pool.
+
+    Args:
+        workers: number of worker processes, 0 to parse inline
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if workers == _pool_workers:
+            return
+        current, _pool, _pool_workers = _pool, None, workers
+        if current is not None:
+            current.shutdown(wait=False)
+        if workers > 0:
+            LOG.info(f'Parsing feeds in {workers} worker process(es)')
+            start_method = ('forkserver' if 'forkserver' in
+                            multiprocessing.get_all_start_methods() else 'spawn')
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=runpy.run_path,
+                initargs=(str(WORKER_SETUP),
+                          {'PACKAGE': __package__, 'PACKAGE_DIR': str(WORKER_SETUP.parent)},
+                          '__parse_worker__'))
+            # Start the workers now rather than on the first parse
+            for _ in range(workers):
+                _pool.submit(int)
+
+
+def shutdown_parse_pool():
+    """Stop the worker pool if one is running."""
+    configure_parse_pool(0)
+
+
+def run_parser(parser, raw: bytes, *args):
+    """Run a parsing function over raw document bytes.
+
+    Args:
+        parser: module level function taking the raw bytes as its first
+                argument. It must return a small picklable result.
+        raw: document to be parsed
+        *args: any extra arguments for the parser
+
+    Returns:
+        Whatever the parser returns
+    """
+    pool = _pool
+    if pool is not None:
+        try:
+            future = pool.submit(parser, raw, *args)
+        except RuntimeError:
+            # Shut down by a concurrent reconfiguration, or broken
+            LOG.debug('Parsing worker pool unavailable, parsing inline')
+        else:
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                LOG.warning('Parsing worker pool failed, parsing inline')
+    return parser(raw, *args)
@@ -0,0 +1,180 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Read the format and length of a bulletin from its first few kilobytes.
+
+Only MPEG audio (mp3) and AAC in ADTS framing are understood, which covers
+the stations in this skill. An ID3v2 tag at the start of the file is skipped.
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+# Bytes needed to find the first frame after a typical ID3 tag
+PROBE_BYTES = 16 * 1024
+# Number of urls whose probe results are remembered
+CACHED_PROBES = 32
+# Seconds a probe result is trusted. Some stations publish each bulletin at
+# the same url, so a result is only kept for the play that made it.
+CACHED_PROBE_TTL = 60
+
+# Details of an audio stream. bitrate is in kbps, duration in seconds.
+AudioInfo = namedtuple('AudioInfo',
+                       'mime codec sample_rate bitrate channels duration')
+
+MPEG_BITRATES = {
+    # (version 1, layer): kbps for bitrate index 1 to 14
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG 1
+    2: (22050, 24000, 16000),  # MPEG 2
+    0: (11025, 12000, 8000),   # MPEG 2.5
+}
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000,
+                     22050, 16000, 12000, 11025, 8000, 7350)
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+def remember_audio_info(url: str, info: AudioInfo):
+    """Store the probe result for a url."""
+    if info is None:
+        return
+    with _cache_lock:
+        _cache[url] = (info, time.monotonic())
+        _cache.move_to_end(url)
+        while len(_cache) > CACHED_PROBES:
+            _cache.popitem(last=False)
+
+
+def cached_audio_info(url: str) -> AudioInfo:
+    """Get the recent probe result for a url, or None if there is none."""
+    with _cache_lock:
+        entry = _cache.get(url)
+    if entry is None or time.monotonic() - entry[1] > CACHED_PROBE_TTL:
+        return None
+    return entry[0]
+
+
+def probe_audio(head: bytes, total_length: int = None) -> AudioInfo:
+    """Identify an audio stream from its first bytes.
+
+    Args:
+        head: bytes from the start of the file
+        total_length: size of the whole file, used to estimate duration
+
+    Returns:
+        AudioInfo, or None if no known audio frame was found
+    """
+    offset = _skip_id3(head)
+    if offset >= len(head):
+        # The tag is bigger than the probe, but it is still an mp3
+        return AudioInfo('audio/mpeg', 'mp3', None, None, None, None)
+    end = min(len(head) - 4, offset + 4096)
+    for position in range(offset, end):
+        if head[position] != 0xFF or head[position + 1] & 0xE0 != 0xE0:
+            continue
+        audio_length = total_length - offset if total_length else None
+        if head[position + 1] & 0x06 == 0:
+            info = _parse_adts(head, position, audio_length)
+        else:
+            info = _parse_mpeg(head, position, audio_length)
+        if info is not None:
+            return info
+    return None
+
+
+def _skip_id3(head: bytes) -> int:
+    """Get the offset of the first byte after any ID3v2 tag."""
+    if len(head) < 10 or not head.startswith(b'ID3'):
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        # Sizes are stored as synchsafe integers of 7 bits per byte
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _parse_mpeg(head: bytes, position: int, audio_length: int) -> AudioInfo:
+    version = (head[position + 1] >> 3) & 0x03
+    layer = 4 - ((head[position + 1] >> 1) & 0x03)
+    bitrate_index = head[position + 2] >> 4
+    rate_index = (head[position + 2] >> 2) & 0x03
+    if version == 1 or layer == 4 or rate_index == 3:
+        return None
+    if bitrate_index in (0, 15):
+        return None
+    is_v1 = version == 3
+    bitrate = MPEG_BITRATES[(is_v1, layer)][bitrate_index - 1]
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    channels = 1 if head[position + 3] >> 6 == 3 else 2
+    duration = _xing_duration(head, position, is_v1, layer, channels,
+                              sample_rate)
+    if duration is None and audio_length:
+        duration = round(audio_length * 8 / (bitrate * 1000))
+    codec = 'mp3' if layer == 3 else f'mp{layer}'
+    return AudioInfo('audio/mpeg', codec, sample_rate, bitrate, channels,
+                     duration)
+
+
+def _xing_duration(head, position, is_v1, layer, channels, sample_rate):
+    """Read the exact duration from a Xing or Info VBR header if present."""
+    if is_v1:
+        side_info = 32 if channels == 2 else 17
+    else:
+        side_info = 17 if channels == 2 else 9
+    tag = position + 4 + side_info
+    if head[tag:tag + 4] not in (b'Xing', b'Info') or len(head) < tag + 12:
+        return None
+    flags = int.from_bytes(head[tag + 4:tag + 8], 'big')
+    if not flags & 0x01:
+        return None
+    frames = int.from_bytes(head[tag + 8:tag + 12], 'big')
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 2 or is_v1:
+        samples_per_frame = 1152
+    else:
+        samples_per_frame = 576
+    return round(frames * samples_per_frame / sample_rate)
+
+
+def _parse_adts(head: bytes, position: int, audio_length: int) -> AudioInfo:
+    if len(head) < position + 7:
+        return None
+    rate_index = (head[position + 2] >> 2) & 0x0F
+    if rate_index >= len(ADTS_SAMPLE_RATES):
+        return None
+    sample_rate = ADTS_SAMPLE_RATES[rate_index]
+    channels = ((head[position + 2] & 0x01) << 2) | (head[position + 3] >> 6)
+    frame_length = (((head[position + 3] & 0x03) << 11)
+                    | (head[position + 4] << 3)
+                    | (head[position + 5] >> 5))
+    if frame_length < 7:
+        return None
+    # Each frame holds 1024 samples, so this estimates the average bitrate
+    bitrate = round(frame_length * 8 * sample_rate / 1024 / 1000)
+    duration = None
+    if audio_length and bitrate:
+        duration = round(audio_length * 8 / (bitrate * 1000))
+    return AudioInfo('audio/aac', 'aac', sample_rate, bitrate, channels,
+                     duration)
@@ -0,0 +1,119 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Profiling of the skill's slow paths that can be switched on at runtime.
+
+Profiles are written in the cProfile format and can be inspected with
+pstats or a viewer such as snakeviz. While profiling is off each wrapped call
+costs a single attribute check.
+"""
+
+import cProfile
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from threading import Lock, local
+
+from mycroft.util import LOG
+
+# Number of profile files kept before the oldest are removed
+PROFILES_KEPT = 50
+
+
+class Profiler:
+    """Deterministic profiler for named sections of the skill."""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        # Monotonic time at which profiling switches itself off
+        self._until = None
+        self._lock = Lock()
+        self._local = local()
+        self._count = 0
+
+    def start(self, directory: str, duration: float = None):
+        """Begin writing profiles to a directory.
+
+        Args:
+            directory: where profile files are written
+            duration: seconds to profile for, or until stopped if None
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._until = time.monotonic() + duration if duration else None
+        self.enabled = True
+        LOG.info(f'Profiling enabled, writing to {self.directory}')
+
+    def stop(self):
+        if self.enabled:
+            LOG.info('Profiling disabled')
+        self.enabled = False
+
+    @contextmanager
+    def profile(self, name: str):
+        """Profile the enclosed block if profiling is on.
+
+        Nested sections are included in the profile of the outermost one.
+        """
+        if not self.enabled or getattr(self._local, 'active', False):
+            yield
+            return
+        if self._until is not None and time.monotonic() > self._until:
+            self.stop()
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another thread is already being profiled
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            self._write(profile, name)
+
+    def profiled(self, name: str):
+        """Decorator profiling every call to a function under a name."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.profile(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _write(self, profile: cProfile.Profile, name: str):
+        """Save a profile and remove the oldest beyond PROFILES_KEPT."""
+        with self._lock:
+            self._count += 1
+            count = self._count
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = Path(self.directory, f'{stamp}-{count:05d}-{name}.prof')
+        try:
+            profile.dump_stats(str(path))
+            with self._lock:
+                profiles = sorted(self.directory.glob('*.prof'))
+                for old in profiles[:-PROFILES_KEPT]:
+                    old.unlink()
+        except OSError as e:
+            LOG.warning(f'Could not write profile {path}: {repr(e)}')
+
+
+profiler = Profiler()
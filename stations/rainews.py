@@ -12,24 +12,36 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
+from .util import TTLCache, extract_json_value, fetch
+
+DOMAIN = "https://www.raiplaysound.it"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:68.0) Gecko/20100101 Firefox/68.0",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# The programme index is large but only changes when a bulletin is published
+programme_cache = TTLCache(ttl=300)
+# Each episode document always points to the same audio file
+episode_cache = TTLCache(ttl=3600)
+
 
 def get_rainews_url():
-    domain = "https://www.raiplaysound.it"
-    json_path = f"{domain}/programmi/gr1.json"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:68.0) Gecko/20100101 Firefox/68.0",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1"
-    }
-    resp = requests.get(json_path, headers=headers).json()
-    path = resp['block']['cards'][0]['path_id']
-    grjson_path = f"{domain}{path}"
-
-    resp = requests.get(grjson_path, headers=headers).json()
-    mp3_url = resp['downloadable_audio']['url']
-    
-    return mp3_url
+    path = programme_cache.get('gr1', _get_latest_episode_path)
+    return episode_cache.get(path, lambda: _get_episode_audio_url(path))
+
+
+def _get_latest_episode_path():
+    """Read the path of the latest episode from the programme index."""
+    document = fetch(f"{DOMAIN}/programmi/gr1.json", HEADERS).decode('utf-8')
+    return extract_json_value(document, 'block', 'cards', 0, 'path_id')
+
+
+def _get_episode_audio_url(path):
+    """Read the mp3 url from an episode document."""
+    document = fetch(f"{DOMAIN}{path}", HEADERS).decode('utf-8')
+    return extract_json_value(document, 'downloadable_audio', 'url')
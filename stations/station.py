@@ -13,19 +13,35 @@
 # limitations under the License.
 """Defines a News Station object"""
 
+import time
 from abc import ABC, abstractproperty
 from builtins import property
+from collections import deque
+from threading import Lock
+from types import MappingProxyType
 from pathlib import Path
-from collections.abc import Callable
 
-import feedparser
+import requests
 from mycroft.util import LOG
 
-from .abc import get_abc_url
-from .ft import get_ft_url
-from .gpb import get_gpb_url
-from .rainews import get_rainews_url
-from .tsf import get_tsf_url
+from .catalog import CatalogEntry, import_getter, load_catalog
+from .episode import (
+    DEFAULT_POLICY,
+    SelectionPolicy,
+    parse_episodes,
+    select_enclosure
+)
+from .parsing import run_parser
+from .util import fetch, seed_mime_type, sniff_url
+
+# Number of recent episodes remembered for each RSS station
+EPISODE_HISTORY = 5
+
+# Seconds a feed parsed ahead of time may be used for the next play
+SEEDED_FEED_TTL = 600
+
+# How to choose between renditions of a bulletin, see set_enclosure_policy
+enclosure_policy = DEFAULT_POLICY
 
 
 class BaseStation(ABC):
@@ -79,27 +95,62 @@ class FileStation(BaseStation):
         return self._media_url
 
 
+class TemplateStation(FileStation):
+    """News Station whose latest briefing url contains the date or time.
+
+    The url is a strftime template expanded in UTC on each play.
+    """
+
+    @property
+    def media_uri(self) -> str:
+        """The media url for the current time."""
+        return time.strftime(self._media_url, time.gmtime())
+
+
 class FetcherStation(BaseStation):
-    """News Station that requires a custom url getter function."""
+    """News Station that requires a custom url getter function.
 
-    def __init__(self, acronym: str, full_name: str, url_getter: Callable, image_file: str = None):
+    The getter may be given as a dotted path, in which case its module is
+    only imported the first time the station is played.
+    """
+
+    def __init__(self, acronym: str, full_name: str, url_getter, image_file: str = None):
         super().__init__(acronym, full_name, image_file)
-        self._get_media_url = url_getter
+        self._url_getter = url_getter
+
+    def _get_media_url(self):
+        if isinstance(self._url_getter, str):
+            self._url_getter = import_getter(self._url_getter)
+        return self._url_getter()
 
     @property
     def media_uri(self) -> str:
         """Get the uri for the media file to be played.
 
-        Uses the stations custom getter function."""
-        return self._get_media_url()
+        Uses the stations custom getter function. Getters may return a list
+        of alternative Enclosures, which are chosen between using the
+        current enclosure policy."""
+        media = self._get_media_url()
+        if isinstance(media, (list, tuple)):
+            media = select_enclosure(media, enclosure_policy).url if media else None
+        return media
 
 
 class RSSStation(BaseStation):
     """News Station based on an RSS feed."""
 
-    def __init__(self, acronym: str, full_name: str, rss_url: str, image_file: str = None):
+    def __init__(self, acronym: str, full_name: str, rss_url: str,
+                 image_file: str = None, ttl: int = 0):
         super().__init__(acronym, full_name, image_file)
         self._rss_url = rss_url
+        # Seconds a fetched feed may be reused for later plays
+        self.ttl = ttl
+        # Latest episodes from the most recent fetch, newest first
+        self.episodes = deque(maxlen=EPISODE_HISTORY)
+        # When episodes were last seeded ahead of a play
+        self._seeded_at = None
+        # When the feed was last fetched
+        self._fetched_at = None
 
     @property
     def media_uri(self) -> str:
@@ -113,98 +164,204 @@ class RSSStation(BaseStation):
     def _get_audio_from_rss(self) -> str:
         """Get the first audio url from the Station RSS feed.
 
-        Selects the first link to an audio file, or falls back to the
+        Selects the first link to an audio file, or the smallest suitable
+        rendition if enabled by the enclosure policy. Falls back to the
         first href link in the entry if no explicit audio can be found.
-
-        Args:
-            rss_url: RSS feed to parse
+        The latest episodes are kept in self.episodes.
 
         Returns:
             Url to a media file or None if no link can be found.
         """
-        audio_url = None
-        data = feedparser.parse(self._rss_url)
-        if data.entries:
-            # select the first link to an audio file
-            for link in data['entries'][0]['links']:
-                if 'audio' in link['type']:
-                    audio_url = link['href']
-                    break
-                else:
-                    # fall back to using the first link in the entry
-                    audio_url = data['entries'][0]['links'][0]['href']
-        return audio_url
+        if self._take_seeded_episodes() or self._is_fetch_fresh():
+            episodes = list(self.episodes)
+        else:
+            episodes = run_parser(parse_episodes, fetch(self._rss_url),
+                                  EPISODE_HISTORY)
+            self.episodes = deque(episodes, maxlen=EPISODE_HISTORY)
+            self._fetched_at = time.monotonic()
+        if not episodes:
+            return None
+        return episodes[0].select_enclosure(enclosure_policy).url
+
+    def seed(self, raw_feed: bytes) -> bool:
+        """Parse already fetched feed content for use by the next play.
+
+        The mime types of the latest episode are also recorded so that no
+        further request is needed to play it.
+
+        Returns:
+            Whether the feed contained any episodes
+        """
+        episodes = run_parser(parse_episodes, raw_feed, EPISODE_HISTORY)
+        if not episodes:
+            return False
+        self.episodes = deque(episodes, maxlen=EPISODE_HISTORY)
+        self._seeded_at = time.monotonic()
+        for enclosure in episodes[0].enclosures:
+            seed_mime_type(enclosure.url, enclosure.mime)
+        return True
+
+    def _take_seeded_episodes(self) -> bool:
+        """Check once whether seeded episodes are fresh enough to play."""
+        seeded_at, self._seeded_at = self._seeded_at, None
+        return (seeded_at is not None
+                and time.monotonic() - seeded_at < SEEDED_FEED_TTL)
+
+    def _is_fetch_fresh(self) -> bool:
+        """Check whether the last fetched feed is within the station's ttl."""
+        return (self._fetched_at is not None and len(self.episodes) > 0
+                and time.monotonic() - self._fetched_at < self.ttl)
+
+
+def set_enclosure_policy(prefer_smallest: bool, min_bitrate: int = None):
+    """Set how stations choose between renditions of a bulletin.
+
+    Args:
+        prefer_smallest: choose the lowest bitrate rendition meeting the
+                         quality floor rather than the first listed
+        min_bitrate: quality floor in kbps
+    """
+    global enclosure_policy
+    enclosure_policy = SelectionPolicy(prefer_smallest, min_bitrate)
+
+
+class CustomStation(BaseStation):
+    """Custom url station whose url could not be checked when it was created.
+
+    The url is sniffed again on each play until that succeeds, after which
+    the station plays as the RSSStation or FileStation the url calls for.
+    """
+
+    def __init__(self, acronym: str, full_name: str, station_url: str):
+        super().__init__(acronym, full_name)
+        self._station_url = station_url
+        self._station = None
+
+    @property
+    def media_uri(self) -> str:
+        """Get the uri for the media file to be played.
+
+        Raises:
+            requests.RequestException if the url still cannot be checked
+        """
+        if self._station is None:
+            self._station = _sniff_custom_station(
+                self.acronym, self.full_name, self._station_url)
+        return self._station.media_uri
 
 
 def create_custom_station(station_url):
     """Create a new station from a custom url.
 
-    First tests to see if the url can be read as an RSS feed, if not assumes it is a
-    direct link.
+    First sniffs the url to see if it is an RSS feed, if not assumes it is a
+    direct link. What was learnt is seeded into the new station so that its
+    first play does not need to fetch the url again. This makes a network
+    request so should not be run on a time critical thread. If the url
+    cannot be reached it is checked again when the station is played.
 
     NOTE: it cannot be a FetcherStation because you can't define the fetching function.
     """
-    is_rss_feed = feedparser.parse(station_url).entries > 0
-    if is_rss_feed:
-        clazz = RSSStation
-    else:
-        clazz = FileStation
-    stations['custom'] = clazz('custom', 'Your custom station', station_url)
-
-
-# NOTE: This list should be kept in sync with the settingsmeta select options,
-# however modifying that file will cause the backend to consider it as a new
-# group of settings. Until there is a better mechanism for handling updated
-# settingsmeta files, we will not be adding new stations to the settings.
-# They can be added to the list of country defaults below.
-
-stations = dict(
-    ABC=FetcherStation('ABC', 'ABC News Australia', get_abc_url, 'ABC.png'),
-    AP=RSSStation('AP', 'AP Hourly Radio News',
-                  'https://www.spreaker.com/show/1401466/episodes/feed', 'AP.png'),
-    BBC=RSSStation('BBC', 'BBC News',
-                   'https://podcasts.files.bbci.co.uk/p02nq0gn.rss', 'BBC.png'),
-    CBC=RSSStation('CBC', 'CBC News',
-                   'https://www.cbc.ca/podcasting/includes/hourlynews.xml', 'CBC.png'),
-    DLF=RSSStation(
-        'DLF', 'DLF', 'https://www.deutschlandfunk.de/podcast-nachrichten.1257.de.podcast.xml', 'DLF.png'),
-    Ekot=RSSStation(
-        'Ekot', 'Ekot', 'https://api.sr.se/api/rss/pod/3795', 'Ekot.png'),
-    FOX=RSSStation('FOX', 'Fox News',
-                   'http://feeds.foxnewsradio.com/FoxNewsRadio', 'FOX.png'),
-    FT=FetcherStation('FT', 'Financial Times', get_ft_url, 'FT.png'),
-    GPB=FetcherStation('GPB', 'Georgia Public Radio', get_gpb_url, None),
-    NPR=RSSStation('NPR', 'NPR News Now',
-                   'https://www.npr.org/rss/podcast.php?id=500005', 'NPR.png'),
-    OE3=FileStation('OE3', 'Ö3 Nachrichten',
-                    'https://oe3meta.orf.at/oe3mdata/StaticAudio/Nachrichten.mp3', None),
-    PBS=RSSStation('PBS', 'PBS NewsHour',
-                   'https://www.pbs.org/newshour/feeds/rss/podcasts/show', 'PBS.png'),
-    RDP=RSSStation('RDP', 'RDP Africa',
-                   'http://www.rtp.pt//play/itunes/5442', None),
-    RG1=FetcherStation('RG1', 'Radio Giornale 1', get_rainews_url, None),
-    RNE=RSSStation('RNE', 'National Spanish Radio',
-                   'http://api.rtve.es/api/programas/36019/audios.rs', None),
-    TSF=FetcherStation('TSF', 'TSF Radio', get_tsf_url, None),
-    VRT=FileStation('VRT', 'VRT Nieuws',
-                    'https://progressive-audio.lwc.vrtcdn.be/content/fixed/11_11niws-snip_hi.mp3', None),
-    WDR=RSSStation(
-        'WDR', 'WDR', 'https://www1.wdr.de/mediathek/audio/wdr-aktuell-news/wdr-aktuell-152.podcast', 'WDR.png'),
-    YLE=RSSStation(
-        'YLE', 'YLE', 'https://feeds.yle.fi/areena/v1/series/1-1440981.rss', 'Yle.png'),
-)
+    acronym, full_name = 'custom', 'Your custom station'
+    try:
+        station = _sniff_custom_station(acronym, full_name, station_url)
+    except requests.RequestException as e:
+        LOG.warning(f'Could not check custom station url: {repr(e)}')
+        station = CustomStation(acronym, full_name, station_url)
+    stations.set(acronym, station)
 
-country_defaults = dict(
-    AT='OE3',
-    AU='ABC',
-    BE='VRT',
-    CA='CBC',
-    DE='DLF',
-    ES='RNE',
-    FI='YLE',
-    IT='RG1',
-    PT='TSF',
-    SE='Ekot',
-    UK='BBC',
-    US='NPR',
-)
+
+def _sniff_custom_station(acronym: str, full_name: str,
+                          station_url: str) -> BaseStation:
+    """Create the kind of station a custom url calls for.
+
+    Raises:
+        requests.RequestException if the url could not be fetched
+    """
+    sniffed = sniff_url(station_url)
+    if sniffed.is_feed:
+        station = RSSStation(acronym, full_name, station_url)
+        if station.seed(sniffed.body):
+            return station
+    seed_mime_type(station_url, sniffed.mime)
+    return FileStation(acronym, full_name, station_url)
+
+
+def create_station(entry: CatalogEntry) -> BaseStation:
+    """Create a station described by a catalog entry."""
+    if entry.type == 'rss':
+        return RSSStation(entry.acronym, entry.full_name, entry.source,
+                          entry.image_file, entry.ttl)
+    if entry.type == 'file':
+        return FileStation(entry.acronym, entry.full_name, entry.source,
+                           entry.image_file)
+    if entry.type == 'template':
+        return TemplateStation(entry.acronym, entry.full_name, entry.source,
+                               entry.image_file)
+    return FetcherStation(entry.acronym, entry.full_name, entry.source,
+                          entry.image_file)
+
+
+class StationRegistry:
+    """Collection of the available stations that is safe to share between threads.
+
+    Each change builds a new immutable snapshot and increments the version,
+    so readers can iterate a consistent snapshot without locking. Anything
+    derived from the stations can be invalidated by comparing versions.
+    """
+
+    def __init__(self, **initial_stations):
+        self._lock = Lock()
+        self._state = (0, MappingProxyType(dict(initial_stations)))
+
+    @property
+    def version(self) -> int:
+        return self._state[0]
+
+    def snapshot(self):
+        """Get a read only mapping of the stations keyed by acronym."""
+        return self._state[1]
+
+    def versioned_snapshot(self) -> tuple:
+        """Get the version and snapshot as a consistent pair."""
+        return self._state
+
+    def set(self, acronym: str, station: BaseStation):
+        """Add or replace a station."""
+        with self._lock:
+            version, current = self._state
+            updated = dict(current)
+            updated[acronym] = station
+            self._state = (version + 1, MappingProxyType(updated))
+
+    def __getitem__(self, acronym: str) -> BaseStation:
+        return self.snapshot()[acronym]
+
+    def __contains__(self, acronym: str) -> bool:
+        return acronym in self.snapshot()
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    def get(self, acronym: str, default=None) -> BaseStation:
+        return self.snapshot().get(acronym, default)
+
+    def keys(self):
+        return self.snapshot().keys()
+
+    def values(self):
+        return self.snapshot().values()
+
+    def items(self):
+        return self.snapshot().items()
+
+
+# The available stations and country defaults are described in catalog.json
+catalog = load_catalog()
+
+stations = StationRegistry(
+    **{entry.acronym: create_station(entry) for entry in catalog})
+
+country_defaults = catalog.country_defaults
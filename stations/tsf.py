@@ -15,11 +15,12 @@
 from datetime import timedelta
 from http import HTTPStatus
 
-import requests
 from pytz import timezone
 
 from mycroft.util.time import now_local
 
+from .util import FETCH_TIMEOUT, rate_limiter, session
+
 def get_tsf_url():
     """Custom inews fetcher for TSF news.
     
@@ -34,7 +35,10 @@ def get_tsf_url():
         date -= timedelta(hours=hours_offset)
         uri = feed.format(hour=date.hour, year=date.year,
                           month=date.month, day=date.day)
-        status = requests.get(uri).status_code
+        rate_limiter.wait(uri)
+        # Only the status is needed, so the audio itself is not downloaded
+        with session.get(uri, stream=True, timeout=FETCH_TIMEOUT) as response:
+            status = response.status_code
         hours_offset += 1
     if status != HTTPStatus.OK:
         return None
@@ -12,51 +12,365 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
-from shutil import copyfile, SpecialFileError
+import json
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from threading import Lock
+from urllib.parse import urlsplit
 
+import requests
 from mycroft.util import LOG
 
+from .probe import PROBE_BYTES, cached_audio_info, probe_audio, remember_audio_info
+
+# Seconds to wait on a remote server before giving up
+FETCH_TIMEOUT = 10
+
+# Keep-alive connections shared by all fetchers
+session = requests.Session()
+
+# Bytes read to identify a remote resource, and the most kept of a feed
+SNIFF_BYTES = 4096
+MAX_FEED_BYTES = 5 * 1024 * 1024
+
+# Mime types already learnt for media urls, see seed_mime_type
+known_mime_types = {}
+
+# Result of sniffing a url. body holds the document if it is a feed.
+SniffResult = namedtuple('SniffResult', 'is_feed mime body')
+
+AUDIO_SIGNATURES = (
+    (b'ID3', 'audio/mpeg'),
+    (b'OggS', 'audio/ogg'),
+    (b'fLaC', 'audio/flac'),
+)
+
+# Requests per second and burst size allowed to any one host
+DEFAULT_HOST_RATE = (2, 5)
+# Hosts that have rate limited the skill in the past
+HOST_RATES = {
+    'www.abc.net.au': (0.5, 3),
+    'www.raiplaysound.it': (0.5, 3),
+}
+
+
+class TokenBucket:
+    """Rate limiter allowing short bursts above a steady request rate."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Tokens may go negative, queueing callers in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            LOG.debug(f'Rate limited, waiting {wait:.2f}s')
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Separate token buckets for each remote host."""
+
+    def __init__(self, default_rate: tuple, host_rates: dict):
+        self.default_rate = default_rate
+        self.host_rates = host_rates
+        self._buckets = {}
+        self._lock = Lock()
+
+    def wait(self, url: str):
+        """Block until a request to the host of url is allowed."""
+        host = urlsplit(url).hostname
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_rates.get(host, self.default_rate)
+                bucket = TokenBucket(rate, burst)
+                self._buckets[host] = bucket
+        bucket.acquire()
+
+
+class Coalescer:
+    """Share the result of one call between concurrent callers.
+
+    While a call for a key is in flight, further calls with the same key wait
+    for it and receive the same result, or exception, instead of repeating
+    the work.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = Lock()
+
+    def run(self, key, func):
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return future.result()
+
+
+rate_limiter = HostRateLimiter(DEFAULT_HOST_RATE, HOST_RATES)
+_requests = Coalescer()
+
+
+class TTLCache:
+    """Small keyed cache whose entries expire after a fixed time."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, key, loader):
+        """Get a cached value, calling loader() to refresh it if expired.
+
+        Args:
+            key: hashable cache key
+            loader: function returning the current value for the key
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+        value = loader()
+        with self._lock:
+            self._entries[key] = (value, now)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def fetch(url: str, headers: dict = None) -> bytes:
+    """Download the raw content of a remote document.
+
+    Concurrent fetches of the same url share a single request, and requests
+    are rate limited per host.
+
+    Args:
+        url: remote url to fetch
+        headers: any extra request headers
+    Returns:
+        Body of the response
+    Raises:
+        requests.HTTPError if the server answered with an error status
+    """
+    def get():
+        rate_limiter.wait(url)
+        response = session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    key = ('fetch', url, tuple(sorted((headers or {}).items())))
+    return _requests.run(key, get)
+
+
+def extract_json_value(document: str, *path):
+    """Decode a single value from a JSON document without parsing it all.
+
+    The path is followed through the nesting of the document. Values before
+    the wanted one at each level are decoded only to step over them, and
+    everything after it is never read. This suits large documents where the
+    wanted value is near the start.
+
+    Args:
+        document: JSON text
+        *path: object keys, or indexes of array items
+
+    Returns:
+        The decoded value
+
+    Raises:
+        KeyError or IndexError if the path is not in the document,
+        ValueError if the document is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    position = _skip_space(document, 0)
+    for step in path:
+        if isinstance(step, int):
+            position = _find_item(document, position, step, decoder)
+        else:
+            position = _find_member(document, position, step, decoder)
+    return decoder.raw_decode(document, position)[0]
+
+
+def _skip_space(document: str, position: int) -> int:
+    while position < len(document) and document[position].isspace():
+        position += 1
+    return position
+
+
+def _expect(document: str, position: int, expected: str) -> int:
+    """Check for one of the expected characters, returning the next position."""
+    if position >= len(document) or document[position] not in expected:
+        raise ValueError(f'Expected one of {expected!r} at {position}')
+    return _skip_space(document, position + 1)
+
+
+def _find_member(document: str, position: int, key: str, decoder) -> int:
+    """Get the position of the value for key in the object at position."""
+    position = _expect(document, position, '{')
+    if document.startswith('}', position):
+        raise KeyError(key)
+    while True:
+        name, position = decoder.raw_decode(document, position)
+        position = _expect(document, _skip_space(document, position), ':')
+        if name == key:
+            return position
+        position = _skip_value(document, position, decoder)
+        if document.startswith('}', position):
+            raise KeyError(key)
+        position = _expect(document, position, ',')
 
-def find_mime_type(url: str) -> str:
+
+def _find_item(document: str, position: int, index: int, decoder) -> int:
+    """Get the position of the item at index in the array at position."""
+    position = _expect(document, position, '[')
+    for _ in range(index):
+        if document.startswith(']', position):
+            raise IndexError(index)
+        position = _skip_value(document, position, decoder)
+        if document.startswith(']', position):
+            raise IndexError(index)
+        position = _expect(document, position, ',')
+    if document.startswith(']', position):
+        raise IndexError(index)
+    return position
+
+
+def _skip_value(document: str, position: int, decoder) -> int:
+    """Step over the value at position and any whitespace after it."""
+    return _skip_space(document, decoder.raw_decode(document, position)[1])
+
+
+def find_mime_type(url: str, probe: bool = True) -> str:
     """Determine the mime type of a file at the given url.
 
+    Rather than only requesting the headers, the first few kilobytes are
+    fetched so the audio format and duration can be probed in the same round
+    trip. The probe is then available from cached_audio_info.
+
     Args:
         url: remote url to check
+        probe: whether to make a request if the type is not already known,
+               False when the file will be probed as it is downloaded
     Returns:
         Mime type - defaults to 'audio/mpeg'
     """
+    if url in known_mime_types:
+        return known_mime_types[url]
+    info = cached_audio_info(url)
+    if info is not None:
+        return info.mime
+    if not probe:
+        return 'audio/mpeg'
+    return _requests.run(('mime', url), lambda: _probe_mime_type(url))
+
+
+def _probe_mime_type(url: str) -> str:
+    rate_limiter.wait(url)
     mime = 'audio/mpeg'
-    response = requests.Session().head(url, allow_redirects=True)
-    if 200 <= response.status_code < 300:
-        mime = response.headers['content-type']
+    headers = {'Range': f'bytes=0-{PROBE_BYTES - 1}'}
+    with session.get(url, headers=headers, stream=True,
+                     timeout=FETCH_TIMEOUT) as response:
+        if 200 <= response.status_code < 300:
+            mime = response.headers['content-type']
+            head = response.raw.read(PROBE_BYTES, decode_content=True)
+            info = probe_audio(head, total_length(response))
+            remember_audio_info(url, info)
+            if info is not None and not mime.startswith('audio/'):
+                # Servers often label media as application/octet-stream
+                mime = info.mime
     return mime
 
 
-def contains_html(file: str) -> bool:
-    """Reads file and reports if a <html> tag is contained.
+def total_length(response) -> int:
+    """Get the size of the whole file from a full or partial response."""
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    if response.status_code == 200:
+        length = response.headers.get('Content-Length', '')
+        return int(length) if length.isdigit() else None
+    return None
 
-    Makes a temporary copy of the file to prevent locking downloads in
-    progress. This should not be considered a robust method of testing if a
-    file is a HTML document, but sufficient for this purpose.
 
-    Args:
-        file: path of file
+def seed_mime_type(url: str, mime: str):
+    """Record the mime type of a url so find_mime_type need not ask."""
+    if mime:
+        known_mime_types[url] = mime
 
+
+def sniff_url(url: str) -> SniffResult:
+    """Tell an RSS feed apart from a direct audio file with one request.
+
+    The content type is checked first, then the leading bytes are compared
+    against common audio signatures and feed markup. Feeds are read in full
+    so they can be parsed without fetching them again.
+
+    Args:
+        url: remote url to check
     Returns:
-        Whether a <html> tag was found
+        SniffResult
     """
-    found_html = False
-    tmp_file = '/tmp/mycroft-news-html-check'
-    try:
-        # Copy file to prevent locking larger file being downloaded
-        copyfile(file, tmp_file)
-        with open(tmp_file, mode='r', encoding="utf-8") as f:
-            for line in f:
-                if '<html>' in line:
-                    found_html = True
-                    break
-    except SpecialFileError as error:
-        if 'is a named pipe' in error.args[0]:
-            LOG.debug('File is a "named pipe" as expected.')
-    return found_html
+    rate_limiter.wait(url)
+    with session.get(url, stream=True, timeout=FETCH_TIMEOUT) as response:
+        content_type = response.headers.get('content-type', '')
+        mime = content_type.split(';')[0].strip().lower()
+        head = response.raw.read(SNIFF_BYTES, decode_content=True)
+        audio_mime = _match_audio_signature(head)
+        if mime.startswith('audio/') or audio_mime:
+            return SniffResult(False, audio_mime or mime, None)
+        if not _looks_like_feed(mime, head):
+            return SniffResult(False, None, None)
+        body = head + response.raw.read(MAX_FEED_BYTES - len(head),
+                                        decode_content=True)
+        return SniffResult(True, mime, body)
+
+
+def _match_audio_signature(head: bytes) -> str:
+    """Identify audio from the magic bytes at the start of a file."""
+    for signature, mime in AUDIO_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    if head[4:8] == b'ftyp':
+        return 'audio/mp4'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'audio/wav'
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        # ADTS frames have the layer bits cleared, MPEG audio does not
+        return 'audio/aac' if head[1] & 0x06 == 0 else 'audio/mpeg'
+    return None
+
+
+def _looks_like_feed(mime: str, head: bytes) -> bool:
+    if 'xml' in mime or 'rss' in mime:
+        return True
+    head = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    return head.startswith(b'<?xml') or b'<rss' in head or b'<feed' in head
@@ -0,0 +1,84 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Language resources used to match utterances, compiled once per language."""
+
+import re
+
+from mycroft.skills.skill_data import read_vocab_file
+
+from .station import catalog
+
+
+class Vocabulary:
+    """Precompiled vocabulary, phrases and station aliases for one language.
+
+    Args:
+        lang: language code the resources were loaded for
+        news_words: entries of News.voc
+        news_phrases: short explicit phrases from PlayTheNews.list
+        news_keyword: localized keyword for "news"
+        station_aliases: alternative names keyed by station acronym
+    """
+
+    def __init__(self, lang: str, news_words: list, news_phrases: list,
+                 news_keyword: str, station_aliases: dict):
+        self.lang = lang
+        # Longest first so the alternation prefers the most specific entry
+        words = sorted({w.lower() for w in news_words}, key=len, reverse=True)
+        self.news_pattern = re.compile(rf"\b(?:{'|'.join(words)})\b") if words else None
+        self.news_phrases = frozenset(p.lower() for p in news_phrases)
+        self.news_keyword = news_keyword.lower()
+        self.station_aliases = station_aliases
+        self._mention_patterns = {}
+
+    def contains_news(self, utterance: str) -> bool:
+        """Check if an utterance includes any of the News vocabulary."""
+        return bool(self.news_pattern and self.news_pattern.search(utterance))
+
+    def mention_pattern(self, station):
+        """Get a regex finding any name of a station in an utterance."""
+        key = (station.acronym, station.full_name)
+        pattern = self._mention_patterns.get(key)
+        if pattern is None:
+            names = [station.acronym, station.full_name]
+            names += self.station_aliases.get(station.acronym) or []
+            names = sorted({re.escape(n.lower()) for n in names},
+                           key=len, reverse=True)
+            pattern = re.compile(rf"\b(?:{'|'.join(names)})\b")
+            self._mention_patterns[key] = pattern
+        return pattern
+
+
+def build_vocabulary(skill) -> Vocabulary:
+    """Load and compile the matching resources for the skill's language.
+
+    Station aliases from the catalog apply to every language and are
+    extended by those translated for the skill's language.
+    """
+    station_aliases = {acronym: list(aliases)
+                       for acronym, aliases in catalog.aliases.items()}
+    for acronym, aliases in skill.load_alternate_station_names().items():
+        station_aliases.setdefault(acronym, []).extend(aliases)
+    news_words = []
+    voc_file = skill.find_resource('News.voc', 'vocab')
+    if voc_file:
+        for aliases in read_vocab_file(voc_file):
+            news_words.extend(aliases)
+    return Vocabulary(
+        lang=skill.lang,
+        news_words=news_words,
+        news_phrases=skill.translate_list('PlayTheNews') or [],
+        news_keyword=skill.translate('OnlyNews'),
+        station_aliases=station_aliases,
+    )
@@ -0,0 +1,108 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Measure how long feed parsing blocks other threads of the skill process.
+
+A heartbeat thread stands in for the messagebus handlers. It asks to wake
+every few milliseconds and records how late it actually woke while feeds are
+parsed inline and then in the worker pool.
+
+Run from the root of the skill, pinned to a single core to mimic low-end
+devices:
+
+    taskset -c 0 python -m test.benchmark.bench_parse_pool
+"""
+
+import argparse
+import statistics
+import time
+from threading import Event, Thread
+
+from stations.parsing import configure_parse_pool, run_parser
+from stations.episode import parse_episodes
+
+HEARTBEAT_INTERVAL = 0.005
+
+ENTRY = """
+<item>
+  <title>Bulletin {n}</title>
+  <description>{summary}</description>
+  <pubDate>Mon, 04 Jan 2021 {hour:02d}:00:00 GMT</pubDate>
+  <enclosure url="https://example.com/news/{n}.mp3"
+             length="1048576" type="audio/mpeg"/>
+</item>"""
+
+
+def build_feed(entries: int) -> bytes:
+    """Create a synthetic podcast feed of roughly realistic size."""
+    summary = 'Headlines from around the world. ' * 20
+    items = ''.join(ENTRY.format(n=n, summary=summary, hour=n % 24)
+                    for n in range(entries))
+    return ('<?xml version="1.0"?><rss version="2.0"><channel>'
+            f'<title>Benchmark</title>{items}</channel></rss>').encode()
+
+
+def measure(raw_feed: bytes, parses: int) -> dict:
+    """Parse the feed repeatedly while tracking heartbeat lateness."""
+    lateness = []
+    done = Event()
+
+    def heartbeat():
+        while not done.is_set():
+            expected = time.perf_counter() + HEARTBEAT_INTERVAL
+            time.sleep(HEARTBEAT_INTERVAL)
+            lateness.append(max(0.0, time.perf_counter() - expected))
+
+    thread = Thread(target=heartbeat, daemon=True)
+    thread.start()
+    start = time.perf_counter()
+    for _ in range(parses):
+        run_parser(parse_episodes, raw_feed, 5)
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+    lateness.sort()
+    return {
+        'wall': elapsed,
+        'p50': statistics.median(lateness),
+        'p99': lateness[int(len(lateness) * 0.99)],
+        'max': lateness[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=300)
+    parser.add_argument('--parses', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    raw_feed = build_feed(args.entries)
+    print(f'Feed size: {len(raw_feed) / 1024:.0f} KiB, '
+          f'{args.parses} parses per mode')
+    print(f'{"mode":<10}{"wall s":>10}{"p50 ms":>10}'
+          f'{"p99 ms":>10}{"max ms":>10}')
+    for mode, workers in (('inline', 0), ('pool', args.workers)):
+        configure_parse_pool(workers)
+        # Warm up the pool so process start up is not measured
+        run_parser(parse_episodes, raw_feed, 5)
+        result = measure(raw_feed, args.parses)
+        print(f'{mode:<10}{result["wall"]:>10.2f}'
+              f'{result["p50"] * 1000:>10.2f}{result["p99"] * 1000:>10.2f}'
+              f'{result["max"] * 1000:>10.2f}')
+    configure_parse_pool(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Drive overlapping Common Play and intent requests at the News Skill.
+
+Many threads call CPS_match_query_phrase, handle_latest_news and CPS_start
+on a single skill instance. Every station is pointed at a local stand in
+feed server, and the skill's messagebus facing methods are replaced by
+recorders. The run reports throughput and latency percentiles for each
+entry point, then checks the shared state for signs of corruption.
+
+Requires mycroft-core to be importable. Run from the root of the skill:
+
+    python -m test.load.cps_storm --threads 16 --requests 2000
+"""
+
+import argparse
+import importlib.util
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+SKILL_ROOT = Path(__file__).parent.parent.parent
+
+PHRASES = [
+    'the news',
+    'news',
+    'the latest news',
+    'news briefing',
+    'headlines',
+    'the BBC news',
+    'NPR news',
+    'the news from DLF',
+    'what is on ABC news',
+    'Fox News',
+    'YLE news',
+]
+
+FEED = """<?xml version="1.0"?>
+<rss version="2.0"><channel><title>{acronym}</title>
+<item><title>{acronym} bulletin</title>
+<enclosure url="{base}/audio/{acronym}.mp3" length="1024" type="audio/mpeg"/>
+</item></channel></rss>"""
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serve a one episode feed per station and a tiny audio file."""
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body without waiting on delayed acknowledgements
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, include_body: bool):
+        time.sleep(self.latency)
+        kind, _, name = self.path.strip('/').partition('/')
+        if kind == 'feed':
+            acronym = name.rsplit('.', 1)[0]
+            base = f'http://{self.headers["Host"]}'
+            body = FEED.format(acronym=acronym, base=base).encode()
+            content_type = 'application/rss+xml'
+        elif kind == 'audio':
+            # A single MPEG 1 Layer III frame header, enough to be probed
+            body = b'\xff\xfb\x90\x64' + bytes(1020)
+            content_type = 'audio/mpeg'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+def load_skill_module():
+    """Import the skill package from its directory, whatever it is named."""
+    spec = importlib.util.spec_from_file_location(
+        'news_skill', SKILL_ROOT / '__init__.py',
+        submodule_search_locations=[str(SKILL_ROOT)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['news_skill'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_skill(module, recorder):
+    """Create a NewsSkill with its Mycroft context replaced by recorders."""
+    news_phrases = (SKILL_ROOT / 'dialog/en-us/PlayTheNews.list').read_text()
+
+    class LoadTestSkill(module.NewsSkill):
+        location = {'city': {'state': {'country': {'code': 'US'}}}}
+        lang = 'en-us'
+
+        def speak_dialog(self, key, data=None, *args, **kwargs):
+            pass
+
+        def enable_intent(self, intent_name):
+            pass
+
+        def disable_intent(self, intent_name):
+            pass
+
+        def CPS_play(self, *args, **kwargs):
+            recorder.played(args[0][0])
+
+        def CPS_send_status(self, artist='', track='', image='', **kwargs):
+            recorder.status(artist)
+
+    module.wait_while_speaking = lambda: None
+    Vocabulary = sys.modules['news_skill.stations.vocabulary'].Vocabulary
+    skill = LoadTestSkill()
+    skill.skill_id = 'mycroft-news.mycroftai'
+    skill.settings = {}
+    skill._vocabularies['en-us'] = Vocabulary(
+        'en-us', ['news', 'headlines'], news_phrases.splitlines(), 'news', {})
+    skill.audioservice = SimpleNamespace(available_backends=lambda: {
+        'local': {'supported_uris': ['file', 'http', 'https'],
+                  'remote': False}})
+    return skill
+
+
+class Recorder:
+    """Collect latencies and check each thread plays what it announces."""
+
+    def __init__(self, names: dict):
+        # Full station names keyed by acronym
+        self.names = names
+        self.latencies = defaultdict(list)
+        self.errors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def timed(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors.append(f'{name}: {repr(e)}')
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[name].append(elapsed)
+
+    def played(self, uri):
+        self._local.uri = uri
+
+    def status(self, artist):
+        uri = getattr(self._local, 'uri', None)
+        self._local.uri = None
+        if not artist:
+            # Status cleared by stop()
+            return
+        if uri is None:
+            self.error(f'status for {artist!r} without playback')
+            return
+        acronym = uri.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        if self.names.get(acronym) != artist:
+            self.error(f'played {uri} but reported {artist!r}')
+
+    def error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+
+def storm(skill, module, recorder, threads: int, requests: int):
+    """Run requests split across threads, mixing the three entry points."""
+    per_thread = requests // threads
+    barrier = threading.Barrier(threads)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(per_thread):
+            phrase = rng.choice(PHRASES)
+            choice = rng.random()
+            if choice < 0.6:
+                recorder.timed('CPS_match_query_phrase',
+                               skill.CPS_match_query_phrase, phrase)
+            elif choice < 0.8:
+                message = SimpleNamespace(data={'utterance': phrase})
+                recorder.timed('handle_latest_news',
+                               skill.handle_latest_news, message)
+            else:
+                station = rng.choice(list(module.stations.values()))
+                recorder.timed('CPS_start', skill.CPS_start,
+                               phrase, station.as_dict())
+
+    workers = [threading.Thread(target=worker, args=(n,))
+               for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def check_shared_state(skill, module, expected_stations, expected_version):
+    """List any inconsistencies left behind by concurrent requests."""
+    problems = []
+    registry = module.stations
+    if registry.version != expected_version:
+        problems.append(f'stations version changed to {registry.version}')
+    if dict(registry.items()) != expected_stations:
+        problems.append('stations registry contents changed')
+    last = skill.last_station_played
+    if last is not None and last not in expected_stations.values():
+        problems.append(f'last_station_played is unknown: {last!r}')
+    if skill.now_playing is not None and last is not None:
+        if skill.now_playing != last.full_name:
+            problems.append(f'now_playing {skill.now_playing!r} does not '
+                            f'match last_station_played {last.full_name!r}')
+    if skill.downloads:
+        problems.append('download left running for an http station')
+    return problems
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds the feed server waits per response')
+    parser.add_argument('--host-rate', type=float, default=1000,
+                        help='requests per second allowed to the feed server')
+    args = parser.parse_args()
+
+    FeedHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    sys.path.insert(0, str(SKILL_ROOT))
+    module = load_skill_module()
+    station_module = sys.modules['news_skill.stations.station']
+    util_module = sys.modules['news_skill.stations.util']
+    util_module.rate_limiter.host_rates['127.0.0.1'] = (
+        args.host_rate, max(1, int(args.host_rate)))
+    for acronym, station in list(module.stations.items()):
+        module.stations.set(acronym, station_module.RSSStation(
+            acronym, station.full_name, f'{base}/feed/{acronym}.xml',
+            station.image_file))
+    expected_stations = dict(module.stations.items())
+    expected_version = module.stations.version
+
+    recorder = Recorder({acronym: station.full_name
+                         for acronym, station in expected_stations.items()})
+    skill = create_skill(module, recorder)
+    elapsed = storm(skill, module, recorder, args.threads, args.requests)
+    skill.resolver.shutdown(wait=True)
+    server.shutdown()
+
+    total = sum(len(v) for v in recorder.latencies.values())
+    print(f'{total} requests on {args.threads} threads in {elapsed:.2f}s '
+          f'({total / elapsed:.1f} req/s)')
+    print(f'{"entry point":<26}{"count":>7}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"p99 ms":>9}{"max ms":>9}')
+    for name, values in sorted(recorder.latencies.items()):
+        values.sort()
+        print(f'{name:<26}{len(values):>7}'
+              f'{statistics.median(values) * 1000:>9.1f}'
+              f'{percentile(values, 0.95) * 1000:>9.1f}'
+              f'{percentile(values, 0.99) * 1000:>9.1f}'
+              f'{values[-1] * 1000:>9.1f}')
+
+    problems = recorder.errors + check_shared_state(
+        skill, module, expected_stations, expected_version)
+    for problem in problems[:20]:
+        print(f'PROBLEM: {problem}')
+    if len(problems) > 20:
+        print(f'... and {len(problems) - 20} more')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
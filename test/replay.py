@@ -0,0 +1,195 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Record and replay the HTTP exchanges made by station fetchers.
+
+A Cassette patches the transports underneath every fetcher: the requests
+HTTPAdapter, used directly and through the shared session, and the urllib
+opener behind urlopen. feedparser is only ever handed bytes fetched by these.
+
+In record mode real requests are made and each exchange is stored in a JSON
+fixture together with how long it took. In replay mode no network access
+is made. Responses come from the fixture, optionally delayed by the recorded
+time multiplied by a scale factor, so latency can be tested as well as
+correctness.
+
+    with Cassette('test/fixtures/NPR.json', mode='replay', scale=1.0):
+        url = stations['NPR'].media_uri
+"""
+
+import base64
+import json
+import os
+import time
+import urllib.request
+from collections import defaultdict
+from email.message import Message
+from io import BytesIO
+from pathlib import Path
+from urllib.response import addinfourl
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+
+# Headers describing the encoding of the original transfer, not the body
+DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+class UnrecordedRequest(Exception):
+    """A request was made during replay that is not in the fixture."""
+
+
+def default_mode(fixture: Path) -> str:
+    """Record when NEWS_SKILL_RECORD is set, otherwise replay."""
+    if os.environ.get('NEWS_SKILL_RECORD'):
+        return 'record'
+    return 'replay'
+
+
+class Cassette:
+    """Context manager recording or replaying HTTP exchanges.
+
+    Args:
+        fixture: path of the JSON file holding the exchanges
+        mode: 'record' or 'replay'
+        scale: multiplier for recorded timings during replay, 0 for none
+    """
+
+    def __init__(self, fixture, mode: str = None, scale: float = 0.0):
+        self.fixture = Path(fixture)
+        self.mode = mode or default_mode(self.fixture)
+        self.scale = scale
+        self.exchanges = []
+        self._replay_queues = defaultdict(list)
+        self._originals = None
+
+    @property
+    def recorded_time(self) -> float:
+        """Total seconds the recorded exchanges took."""
+        return sum(e['elapsed'] for e in self.exchanges)
+
+    def __enter__(self):
+        if self.mode == 'replay':
+            with open(self.fixture) as f:
+                self.exchanges = json.load(f)
+            for exchange in self.exchanges:
+                self._replay_queues[self._key(exchange)].append(exchange)
+        self._originals = (HTTPAdapter.send,
+                           urllib.request.OpenerDirector.open)
+        cassette = self
+
+        def send(adapter, request, **kwargs):
+            return cassette._send(adapter, request, **kwargs)
+
+        def open_url(opener, url, data=None, *args, **kwargs):
+            return cassette._open(opener, url, data, *args, **kwargs)
+
+        HTTPAdapter.send = send
+        urllib.request.OpenerDirector.open = open_url
+        return self
+
+    def __exit__(self, *exc_info):
+        HTTPAdapter.send, urllib.request.OpenerDirector.open = self._originals
+        if self.mode == 'record':
+            self.fixture.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.fixture, 'w') as f:
+                json.dump(self.exchanges, f, indent=1)
+
+    @staticmethod
+    def _key(exchange: dict) -> tuple:
+        return exchange['method'], exchange['url'], exchange.get('range')
+
+    def _send(self, adapter, request, **kwargs):
+        """Stand in for HTTPAdapter.send."""
+        range_header = request.headers.get('Range')
+        if self.mode == 'record':
+            start = time.perf_counter()
+            kwargs['stream'] = False
+            response = self._originals[0](adapter, request, **kwargs)
+            exchange = self._store(request.method, request.url, range_header,
+                                   response.status_code, response.headers,
+                                   response.content, start)
+        else:
+            exchange = self._next(request.method, request.url, range_header)
+        return self._build_response(request, exchange)
+
+    def _open(self, opener, url, data=None, *args, **kwargs):
+        """Stand in for OpenerDirector.open, used by urlopen."""
+        full_url = url if isinstance(url, str) else url.full_url
+        method = 'GET' if data is None else 'POST'
+        if self.mode == 'record':
+            start = time.perf_counter()
+            response = self._originals[1](opener, url, data, *args, **kwargs)
+            exchange = self._store(method, full_url, None, response.status,
+                                   dict(response.headers), response.read(),
+                                   start)
+        else:
+            exchange = self._next(method, full_url, None)
+        headers = Message()
+        for name, value in exchange['headers'].items():
+            headers[name] = value
+        return addinfourl(BytesIO(self._body(exchange)), headers,
+                          exchange['url'], exchange['status'])
+
+    def _store(self, method, url, range_header, status, headers, body,
+               start) -> dict:
+        exchange = {
+            'method': method,
+            'url': url,
+            'range': range_header,
+            'status': status,
+            'headers': {k: v for k, v in headers.items()
+                        if k.lower() not in DROPPED_HEADERS},
+            'body': base64.b64encode(body).decode('ascii'),
+            'elapsed': time.perf_counter() - start,
+        }
+        self.exchanges.append(exchange)
+        return exchange
+
+    def _next(self, method, url, range_header) -> dict:
+        """Get the next recorded exchange for a request, after its delay."""
+        queue = self._replay_queues.get((method, url, range_header))
+        if not queue:
+            raise UnrecordedRequest(f'{method} {url} range={range_header}')
+        # Repeat the last exchange if a request is made more often than
+        # when it was recorded
+        exchange = queue.pop(0) if len(queue) > 1 else queue[0]
+        if self.scale:
+            time.sleep(exchange['elapsed'] * self.scale)
+        return exchange
+
+    @staticmethod
+    def _body(exchange: dict) -> bytes:
+        return base64.b64decode(exchange['body'])
+
+    def _build_response(self, request, exchange: dict) -> Response:
+        body = self._body(exchange)
+        headers = dict(exchange['headers'], **{'Content-Length': str(len(body))})
+        response = Response()
+        response.status_code = exchange['status']
+        response.headers = CaseInsensitiveDict(headers)
+        response.url = exchange['url']
+        response.request = request
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = ''
+        response.raw = HTTPResponse(body=BytesIO(body), headers=headers,
+                                    status=exchange['status'],
+                                    preload_content=False,
+                                    decode_content=False)
+        return response
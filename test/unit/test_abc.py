@@ -16,14 +16,22 @@
 import requests
 import unittest
 
-from stations.abc import abc
+from stations.abc import get_abc_url
+from test.replay import FIXTURE_DIR, Cassette, default_mode
 
+FIXTURE = FIXTURE_DIR / 'test_abc.json'
+
+
+@unittest.skipIf(default_mode(FIXTURE) == 'replay' and not FIXTURE.exists(),
+                 'No recorded fixture for ABC')
 class ABCAustralia(unittest.TestCase):
     def test_matches(self):
-        url = abc()
-        print(url)
-        self.assertIsInstance(url, str)
-        self.assertEqual(url[-4:], ".mp3")
-        response = requests.get(url)
-        self.assertEqual(response.status_code, 200)
+        with Cassette(FIXTURE):
+            url = get_abc_url()
+            print(url)
+            self.assertIsInstance(url, str)
+            self.assertEqual(url[-4:], ".mp3")
+            # HEAD keeps the recorded fixture free of the audio file
+            response = requests.head(url, allow_redirects=True)
+            self.assertEqual(response.status_code, 200)
     
@@ -0,0 +1,84 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from stations.catalog import import_getter, load_catalog, parse_catalog
+from stations.station import (
+    FetcherStation,
+    RSSStation,
+    TemplateStation,
+    create_station,
+    stations
+)
+from stations.util import fetch
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = parse_catalog({'stations': [
+            {'acronym': 'NPR', 'name': 'NPR News Now', 'type': 'rss',
+             'source': 'https://npr.org/feed', 'ttl': 300,
+             'countries': ['US'], 'aliases': ['National Public Radio']},
+            {'acronym': 'DAY', 'name': 'Daily', 'type': 'template',
+             'source': 'https://example.com/%Y%m%d.mp3'},
+            {'acronym': 'UTIL', 'name': 'Fetched', 'type': 'fetcher',
+             'source': '.util.fetch'},
+        ]})
+
+    def test_indexes(self):
+        self.assertEqual(self.catalog.get('NPR').ttl, 300)
+        self.assertEqual(self.catalog.default_for('US').acronym, 'NPR')
+        self.assertIsNone(self.catalog.default_for('AU'))
+        self.assertEqual(self.catalog.aliases,
+                         {'NPR': ['national public radio']})
+
+    def test_create_stations(self):
+        npr = create_station(self.catalog.get('NPR'))
+        self.assertIsInstance(npr, RSSStation)
+        self.assertEqual(npr.ttl, 300)
+        day = create_station(self.catalog.get('DAY'))
+        self.assertIsInstance(day, TemplateStation)
+        self.assertRegex(day.media_uri, r'^https://example.com/\d{8}\.mp3$')
+        self.assertIsInstance(create_station(self.catalog.get('UTIL')),
+                              FetcherStation)
+
+    def test_getters_are_imported_by_path(self):
+        self.assertIs(import_getter('.util.fetch'), fetch)
+
+    def test_invalid_entries(self):
+        with self.assertRaises(ValueError):
+            parse_catalog({'stations': [{'acronym': 'X', 'type': 'rss'}]})
+        with self.assertRaises(ValueError):
+            parse_catalog({'stations': [
+                {'acronym': 'X', 'name': 'X', 'type': 'tv', 'source': ''}]})
+        with self.assertRaises(ValueError):
+            parse_catalog({'stations': [
+                {'acronym': 'X', 'name': 'X', 'type': 'file', 'source': ''},
+                {'acronym': 'X', 'name': 'X', 'type': 'file', 'source': ''}]})
+
+
+class TestShippedCatalog(unittest.TestCase):
+
+    def test_every_entry_is_registered(self):
+        catalog = load_catalog()
+        self.assertEqual([entry.acronym for entry in catalog],
+                         [acronym for acronym in stations if acronym != 'custom'])
+
+    def test_country_defaults_exist(self):
+        catalog = load_catalog()
+        for country_code, acronym in catalog.country_defaults.items():
+            with self.subTest(country=country_code):
+                self.assertIsNotNone(catalog.get(acronym))
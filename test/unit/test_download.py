@@ -0,0 +1,244 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+from stations import download
+from stations.download import CHUNK_SIZE, MediaDownload
+
+# Dropping on a chunk boundary keeps the resume offset predictable
+DROP_AFTER = 2 * CHUNK_SIZE
+# MPEG 1 Layer III, 128 kbps, 44.1 kHz, joint stereo
+MP3_FRAME = b'\xff\xfb\x90\x64' + bytes(413)
+
+
+class MediaServer(BaseHTTPRequestHandler):
+    """Serves one file honouring validators, Range and If-Range."""
+    protocol_version = 'HTTP/1.1'
+    body = b''
+    etag = '"v1"'
+    content_type = 'audio/mpeg'
+    # Bytes sent before dropping the connection on the next request
+    drop_after = None
+    # Error statuses to answer the next requests with, in order
+    errors = []
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = MediaServer
+        server.requests.append(dict(self.headers))
+        if server.errors:
+            page = b'<html><body>Error</body></html>'
+            self.send_response(server.errors.pop(0))
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.end_headers()
+            return
+        start = 0
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if byte_range and (if_range is None or if_range == server.etag):
+            start = int(byte_range[len('bytes='):-1])
+        body = server.body[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Type', server.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range',
+                             f'bytes {start}-{len(server.body) - 1}/{len(server.body)}')
+        self.end_headers()
+        if server.drop_after is not None:
+            self.wfile.write(body[:server.drop_after])
+            self.wfile.flush()
+            server.drop_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class TestMediaDownload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MediaServer)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/bulletin.mp3'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        MediaServer.body = os.urandom(100000)
+        MediaServer.etag = '"v1"'
+        MediaServer.content_type = 'audio/mpeg'
+        MediaServer.drop_after = None
+        MediaServer.errors = []
+        MediaServer.requests = []
+        patches = [
+            patch.object(download, 'rate_limiter'),
+            patch.object(download, 'TIMEOUT', (1, 1)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def play(self, stream: Path = None) -> bytes:
+        """Download the file, returning the bytes written to the stream."""
+        stream = stream or Path(self.cache_dir.name, 'stream')
+        media = MediaDownload(self.url, self.cache_dir.name, str(stream))
+        media.start()
+        media._thread.join(10)
+        self.assertFalse(media._thread.is_alive())
+        return stream.read_bytes()
+
+    def test_resume_after_dropped_connection(self):
+        MediaServer.drop_after = DROP_AFTER
+        self.assertEqual(self.play(), MediaServer.body)
+        self.assertEqual(MediaServer.requests[1]['Range'], f'bytes={DROP_AFTER}-')
+        self.assertEqual(MediaServer.requests[1]['If-Range'], '"v1"')
+
+    def test_restart_reuses_partial_download(self):
+        MediaServer.drop_after = DROP_AFTER
+        with patch.object(download, 'MAX_RETRIES', 0):
+            self.assertEqual(self.play(), MediaServer.body[:DROP_AFTER])
+        MediaServer.requests = []
+        self.assertEqual(self.play(), MediaServer.body)
+        self.assertEqual(len(MediaServer.requests), 1)
+        self.assertEqual(MediaServer.requests[0]['Range'], f'bytes={DROP_AFTER}-')
+
+    def test_complete_download_is_revalidated(self):
+        self.play()
+        MediaServer.requests = []
+        self.assertEqual(self.play(), MediaServer.body)
+        self.assertEqual(MediaServer.requests[0]['If-None-Match'], '"v1"')
+
+    def test_changed_file_replaces_cache(self):
+        self.play()
+        MediaServer.body = os.urandom(80000)
+        MediaServer.etag = '"v2"'
+        self.assertEqual(self.play(), MediaServer.body)
+        MediaServer.requests = []
+        self.assertEqual(self.play(), MediaServer.body)
+        self.assertEqual(MediaServer.requests[0]['If-None-Match'], '"v2"')
+
+    def test_changed_partial_download_is_not_played(self):
+        MediaServer.drop_after = DROP_AFTER
+        with patch.object(download, 'MAX_RETRIES', 0):
+            self.play()
+        MediaServer.body = os.urandom(80000)
+        MediaServer.etag = '"v2"'
+        self.assertEqual(self.play(), MediaServer.body)
+
+    def test_probed_before_stream_is_opened(self):
+        MediaServer.body = MP3_FRAME * 200
+        fifo = Path(self.cache_dir.name, 'fifo')
+        os.mkfifo(fifo)
+        media = MediaDownload(self.url, self.cache_dir.name, str(fifo))
+        media.start()
+        info = media.wait_for_probe(5)
+        self.assertEqual(info.mime, 'audio/mpeg')
+        self.assertEqual(info.bitrate, 128)
+        self.assertEqual(len(MediaServer.requests), 1)
+        with open(fifo, 'rb') as stream:
+            self.assertEqual(stream.read(), MediaServer.body)
+        media._thread.join(5)
+
+    def test_cached_file_is_probed(self):
+        MediaServer.body = MP3_FRAME * 200
+        self.play()
+        media = MediaDownload(self.url, self.cache_dir.name,
+                              str(Path(self.cache_dir.name, 'stream')))
+        media.start()
+        self.assertEqual(media.wait_for_probe(5).codec, 'mp3')
+        media._thread.join(5)
+
+    def test_error_page_is_not_audio(self):
+        MediaServer.body = b'<html><body>Not found</body></html>'
+        MediaServer.content_type = 'text/html'
+        media = MediaDownload(self.url, self.cache_dir.name,
+                              str(Path(self.cache_dir.name, 'stream')))
+        media.start()
+        self.assertIsNone(media.wait_for_probe(5))
+        self.assertEqual(media.content_type, 'text/html')
+        media._thread.join(5)
+
+    def test_client_error_is_not_retried(self):
+        MediaServer.errors = [404]
+        media = MediaDownload(self.url, self.cache_dir.name,
+                              str(Path(self.cache_dir.name, 'stream')))
+        media.start()
+        self.assertIsNone(media.wait_for_probe(5))
+        media._thread.join(5)
+        self.assertEqual(media.error_status, 404)
+        self.assertEqual(media.content_type, 'text/html')
+        self.assertEqual(len(MediaServer.requests), 1)
+
+    def test_server_error_is_retried(self):
+        MediaServer.errors = [503]
+        self.assertEqual(self.play(), MediaServer.body)
+        self.assertEqual(len(MediaServer.requests), 2)
+
+    def test_same_url_waits_for_previous_download(self):
+        fifo = Path(self.cache_dir.name, 'fifo')
+        os.mkfifo(fifo)
+        first = MediaDownload(self.url, self.cache_dir.name, str(fifo))
+        first.start()
+        first.wait_for_probe(5)
+        second = MediaDownload(self.url, self.cache_dir.name,
+                               str(Path(self.cache_dir.name, 'stream')))
+        second.start()
+        # The first download is blocked until its stream is read
+        with open(fifo, 'rb') as stream:
+            self.assertEqual(len(MediaServer.requests), 1)
+            self.assertEqual(stream.read(), MediaServer.body)
+        first._thread.join(5)
+        second._thread.join(5)
+        self.assertEqual(Path(second.stream).read_bytes(), MediaServer.body)
+        # The cache completed by the first download is revalidated
+        self.assertEqual(MediaServer.requests[1]['If-None-Match'], '"v1"')
+
+    def test_active_downloads_are_not_pruned(self):
+        active = Path(self.cache_dir.name, 'active.part')
+        active.write_bytes(b'playing')
+        for name in ('old', 'older', 'oldest'):
+            Path(self.cache_dir.name, f'{name}.part').write_bytes(b'')
+        playing = MediaDownload(self.url, self.cache_dir.name, '')
+        playing.part_file = active
+        with patch.object(download, '_active_downloads', [playing]):
+            self.play()
+        self.assertTrue(active.exists())
+        self.assertEqual(len(list(Path(self.cache_dir.name).glob('*.part'))),
+                         download.CACHED_DOWNLOADS + 1)
@@ -0,0 +1,95 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from stations.episode import (
+    Enclosure,
+    SelectionPolicy,
+    parse_episodes,
+    select_enclosure
+)
+
+FEED = b"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+<channel>
+  <title>Test News</title>
+  <item>
+    <title>Latest bulletin</title>
+    <pubDate>Mon, 04 Jan 2021 10:00:00 GMT</pubDate>
+    <link>https://example.com/latest</link>
+    <enclosure url="https://example.com/latest.mp3"
+               length="2048" type="audio/mpeg"/>
+    <itunes:duration>05:10</itunes:duration>
+  </item>
+  <item>
+    <title>Previous bulletin</title>
+    <link>https://example.com/previous</link>
+  </item>
+  <item>
+    <title>Oldest bulletin</title>
+    <enclosure url="https://example.com/oldest.mp3" type="audio/mpeg"/>
+  </item>
+</channel>
+</rss>"""
+
+
+class TestParseEpisodes(unittest.TestCase):
+
+    def test_audio_enclosure_is_selected(self):
+        latest = parse_episodes(FEED, 5)[0]
+        self.assertEqual(latest.url, 'https://example.com/latest.mp3')
+        self.assertEqual(latest.mime, 'audio/mpeg')
+        self.assertEqual(latest.length, 2048)
+        self.assertEqual(latest.duration, 310)
+        self.assertEqual(latest.published, 1609754400)
+        self.assertEqual(latest.title, 'Latest bulletin')
+
+    def test_falls_back_to_first_link(self):
+        previous = parse_episodes(FEED, 5)[1]
+        self.assertEqual(previous.url, 'https://example.com/previous')
+        self.assertIsNone(previous.length)
+
+    def test_limit(self):
+        episodes = parse_episodes(FEED, 2)
+        self.assertEqual([e.title for e in episodes],
+                         ['Latest bulletin', 'Previous bulletin'])
+
+
+class TestSelectEnclosure(unittest.TestCase):
+
+    def setUp(self):
+        self.high = Enclosure('high.mp3', 'audio/mpeg', bitrate=128)
+        self.medium = Enclosure('medium.mp3', 'audio/mpeg', bitrate=64)
+        self.low = Enclosure('low.mp3', 'audio/mpeg', bitrate=24)
+        self.enclosures = [self.high, self.medium, self.low]
+
+    def test_first_by_default(self):
+        policy = SelectionPolicy(prefer_smallest=False, min_bitrate=None)
+        self.assertIs(select_enclosure(self.enclosures, policy), self.high)
+
+    def test_smallest_meeting_floor(self):
+        policy = SelectionPolicy(prefer_smallest=True, min_bitrate=32)
+        self.assertIs(select_enclosure(self.enclosures, policy), self.medium)
+
+    def test_best_available_below_floor(self):
+        policy = SelectionPolicy(prefer_smallest=True, min_bitrate=256)
+        self.assertIs(select_enclosure(self.enclosures, policy), self.high)
+
+    def test_bitrate_estimated_from_length(self):
+        large = Enclosure('large.mp3', 'audio/mpeg', length=4800000)
+        small = Enclosure('small.mp3', 'audio/mpeg', length=1200000)
+        policy = SelectionPolicy(prefer_smallest=True, min_bitrate=32)
+        # 300 seconds gives 128 kbps and 32 kbps
+        self.assertIs(select_enclosure([large, small], policy, 300), small)
@@ -0,0 +1,46 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import unittest
+
+from stations import parsing
+from stations.parsing import configure_parse_pool, run_parser, shutdown_parse_pool
+
+
+def _pid_and_text(raw: bytes) -> tuple:
+    return os.getpid(), raw.decode()
+
+
+class TestParsePool(unittest.TestCase):
+
+    def tearDown(self):
+        shutdown_parse_pool()
+
+    def test_inline_by_default(self):
+        self.assertEqual(run_parser(_pid_and_text, b'feed'), (os.getpid(), 'feed'))
+
+    def test_workers_are_not_forked_from_the_skill(self):
+        configure_parse_pool(1)
+        start_method = parsing._pool._mp_context.get_start_method()
+        self.assertIn(start_method, ('forkserver', 'spawn'))
+        pid, result = run_parser(_pid_and_text, b'feed')
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(result, 'feed')
+
+    def test_shut_down_pool_parses_inline(self):
+        configure_parse_pool(1)
+        # As if reconfigured between reading the pool and submitting to it
+        parsing._pool.shutdown()
+        self.assertEqual(run_parser(_pid_and_text, b'feed'), (os.getpid(), 'feed'))
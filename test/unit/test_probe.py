@@ -0,0 +1,71 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+from unittest.mock import patch
+
+from stations import probe
+from stations.probe import cached_audio_info, probe_audio, remember_audio_info
+
+# ID3v2.4 tag with a 20 byte body
+ID3_TAG = b'ID3\x04\x00\x00\x00\x00\x00\x14' + bytes(20)
+# MPEG 1 Layer III, 128 kbps, 44.1 kHz, joint stereo
+MP3_FRAME = b'\xff\xfb\x90\x64' + bytes(413)
+# AAC LC, 44.1 kHz, stereo, 372 byte frame
+ADTS_FRAME = b'\xff\xf1\x50\x80\x2e\x9f\xfc' + bytes(365)
+
+
+class TestProbeAudio(unittest.TestCase):
+
+    def test_mp3_after_id3_tag(self):
+        head = ID3_TAG + MP3_FRAME * 4
+        info = probe_audio(head, total_length=len(ID3_TAG) + 4800000)
+        self.assertEqual(info.mime, 'audio/mpeg')
+        self.assertEqual(info.codec, 'mp3')
+        self.assertEqual(info.sample_rate, 44100)
+        self.assertEqual(info.bitrate, 128)
+        self.assertEqual(info.channels, 2)
+        self.assertEqual(info.duration, 300)
+
+    def test_mp3_xing_header(self):
+        side_info = bytes(32)
+        xing = b'Xing' + (1).to_bytes(4, 'big') + (11484).to_bytes(4, 'big')
+        frame = b'\xff\xfb\x90\x64' + side_info + xing
+        info = probe_audio(frame + bytes(400))
+        # 11484 frames of 1152 samples at 44.1 kHz
+        self.assertEqual(info.duration, 300)
+
+    def test_adts(self):
+        info = probe_audio(ADTS_FRAME * 4, total_length=372 * 1000)
+        self.assertEqual(info.mime, 'audio/aac')
+        self.assertEqual(info.sample_rate, 44100)
+        self.assertEqual(info.channels, 2)
+        self.assertEqual(info.bitrate, 128)
+
+    def test_large_id3_tag(self):
+        head = b'ID3\x04\x00\x00\x00\x01\x00\x00' + bytes(100)
+        self.assertEqual(probe_audio(head).mime, 'audio/mpeg')
+
+    def test_not_audio(self):
+        self.assertIsNone(probe_audio(b'<html><body>Not found</body></html>'))
+
+
+class TestProbeCache(unittest.TestCase):
+
+    def test_result_expires(self):
+        info = probe_audio(MP3_FRAME * 4, total_length=4800000)
+        remember_audio_info('https://example.com/fixed.mp3', info)
+        self.assertEqual(cached_audio_info('https://example.com/fixed.mp3'), info)
+        with patch.object(probe, 'CACHED_PROBE_TTL', -1):
+            self.assertIsNone(cached_audio_info('https://example.com/fixed.mp3'))
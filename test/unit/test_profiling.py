@@ -0,0 +1,82 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from stations import profiling
+from stations.profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.profiler = Profiler()
+
+    def profiles(self) -> list:
+        return sorted(path.name for path in
+                      Path(self.directory.name).glob('*.prof'))
+
+    def run_section(self, name: str = 'section'):
+        with self.profiler.profile(name):
+            sum(range(100))
+
+    def test_profiles_written_only_while_enabled(self):
+        self.run_section()
+        self.profiler.start(self.directory.name)
+        self.run_section('resolve')
+        self.profiler.stop()
+        self.run_section()
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('-00001-resolve.prof'))
+
+    def test_nested_sections_share_one_profile(self):
+        self.profiler.start(self.directory.name)
+        with self.profiler.profile('outer'):
+            self.run_section('inner')
+        self.assertEqual(len(self.profiles()), 1)
+        self.assertTrue(self.profiles()[0].endswith('-outer.prof'))
+
+    def test_profiling_stops_after_duration(self):
+        self.profiler.start(self.directory.name, duration=60)
+        self.run_section()
+        later = time.monotonic() + 61
+        with patch.object(profiling.time, 'monotonic', return_value=later):
+            self.run_section()
+        self.assertFalse(self.profiler.enabled)
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_oldest_profiles_are_removed(self):
+        self.profiler.start(self.directory.name)
+        with patch.object(profiling, 'PROFILES_KEPT', 3):
+            for _ in range(5):
+                self.run_section()
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 3)
+        self.assertTrue(profiles[0].endswith('-00003-section.prof'))
+
+    def test_decorated_function_is_profiled(self):
+        @self.profiler.profiled('decorated')
+        def work():
+            return 42
+
+        self.profiler.start(self.directory.name)
+        self.assertEqual(work(), 42)
+        self.assertTrue(self.profiles()[0].endswith('-decorated.prof'))
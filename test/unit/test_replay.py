@@ -0,0 +1,76 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.request import urlopen
+
+import requests
+
+from test.replay import Cassette, UnrecordedRequest
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(0.1)
+        body = f'<rss>{self.path}</rss>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fixture = Path(self.tmp.name, 'exchanges.json')
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{server.server_port}'
+        with Cassette(self.fixture, mode='record'):
+            requests.get(f'{self.base}/feed')
+            urlopen(f'{self.base}/page').read()
+        server.shutdown()
+        server.server_close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replay_without_network(self):
+        with Cassette(self.fixture, mode='replay'):
+            self.assertEqual(requests.get(f'{self.base}/feed').content,
+                             b'<rss>/feed</rss>')
+            self.assertEqual(urlopen(f'{self.base}/page').read(),
+                             b'<rss>/page</rss>')
+
+    def test_replay_with_recorded_timing(self):
+        with Cassette(self.fixture, mode='replay', scale=1.0) as cassette:
+            start = time.perf_counter()
+            requests.get(f'{self.base}/feed')
+            elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, cassette.exchanges[0]['elapsed'])
+
+    def test_unrecorded_request(self):
+        with Cassette(self.fixture, mode='replay'):
+            with self.assertRaises(UnrecordedRequest):
+                requests.get(f'{self.base}/other')
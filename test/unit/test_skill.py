@@ -0,0 +1,364 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Exercise the skill's play handlers against a local stand in server.
+
+Requires mycroft-core to be importable.
+"""
+import sys
+import threading
+import unittest
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from test.load.cps_storm import FeedHandler, create_skill, load_skill_module
+
+
+class CountingFeedHandler(FeedHandler):
+    """Stand in server that records the path of every GET request."""
+    paths = []
+
+    def do_GET(self):
+        CountingFeedHandler.paths.append(self.path)
+        super().do_GET()
+
+
+class Recorder:
+    """Collect what the skill plays and reports."""
+
+    def __init__(self):
+        self.events = []
+
+    def played(self, uri):
+        self.events.append(('play', uri))
+
+    def status(self, artist):
+        self.events.append(('status', artist))
+
+
+class SkillTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CountingFeedHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+        cls.module = load_skill_module()
+        cls.station_module = sys.modules['news_skill.stations.station']
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.recorder = Recorder()
+        self.skill = create_skill(self.module, self.recorder)
+        self.skill.speak_dialog = Mock()
+        self.skill.enable_intent = Mock()
+        self.skill.disable_intent = Mock()
+        self.skill.audioservice.queue = lambda tracks: self.recorder.events.append(
+            ('queue', tracks[0][0]))
+        self.addCleanup(self.skill.resolver.shutdown)
+        self.addCleanup(self.skill.stop_download)
+        CountingFeedHandler.paths = []
+
+    def station(self, acronym: str):
+        """Create a station served by the local server."""
+        return self.station_module.FileStation(
+            acronym, f'{acronym} News', f'{self.base}/audio/{acronym}.mp3')
+
+
+class TestMatchStations(SkillTestCase):
+
+    def setUp(self):
+        super().setUp()
+        vocabulary = self.skill.vocabulary
+        vocabulary.station_aliases = {'DLF': ['deutschlandfunk']}
+        vocabulary._mention_patterns.clear()
+
+    def match(self, utterance):
+        return [station.acronym for station in
+                self.module.match_stations_from_utterance(self.skill, utterance)]
+
+    def test_stations_named_by_full_name(self):
+        self.assertEqual(
+            self.match('play the news from abc and the financial times'),
+            ['ABC', 'FT'])
+
+    def test_stations_named_by_alias(self):
+        self.assertEqual(self.match('play deutschlandfunk and wdr'),
+                         ['DLF', 'WDR'])
+
+    def test_mention_order_is_kept(self):
+        self.assertEqual(self.match('the news from npr then bbc'),
+                         ['NPR', 'BBC'])
+
+    def test_similar_acronyms_are_not_confused(self):
+        self.assertEqual(self.match('play the bbc news'), ['BBC'])
+
+    def test_no_station_named(self):
+        self.assertEqual(self.match('play the news'), [])
+
+
+class TestPlaylist(SkillTestCase):
+
+    def test_first_station_plays_and_rest_are_queued(self):
+        playlist = [self.station('DLF'), self.station('BBC'), self.station('NPR')]
+        self.skill.handle_playlist_request(playlist)
+        self.assertEqual(self.recorder.events, [
+            ('play', f'{self.base}/audio/DLF.mp3'),
+            ('status', 'DLF News'),
+            ('queue', f'{self.base}/audio/BBC.mp3'),
+            ('queue', f'{self.base}/audio/NPR.mp3'),
+        ])
+        self.assertEqual(self.skill.last_playlist_played, playlist)
+        self.skill.enable_intent.assert_called_with('restart_playback')
+
+    def test_unresolved_stations_are_skipped(self):
+        playlist = [self.station('DLF'), self.station('BBC'), self.station('NPR')]
+        failed = Future()
+        failed.set_exception(ValueError('no episodes'))
+        resolutions = [failed]
+        for station in playlist[1:]:
+            resolved = Future()
+            resolved.set_result((station.media_uri, 'audio/mpeg'))
+            resolutions.append(resolved)
+        self.skill._play_playlist(playlist, resolutions, threading.Event())
+        self.assertEqual(self.recorder.events, [
+            ('play', f'{self.base}/audio/BBC.mp3'),
+            ('status', 'BBC News'),
+            ('queue', f'{self.base}/audio/NPR.mp3'),
+        ])
+
+    def test_nothing_playable(self):
+        failed = Future()
+        failed.set_exception(ValueError('no episodes'))
+        cancelled = threading.Event()
+        self.skill._play_playlist([self.station('DLF')], [failed], cancelled)
+        self.assertEqual(self.recorder.events, [])
+        self.assertTrue(cancelled.is_set())
+        self.skill.speak_dialog.assert_called_with(
+            'could.not.start.the.news.feed')
+
+    def test_cancelled_playlist_plays_nothing(self):
+        resolved = Future()
+        resolved.set_result((f'{self.base}/audio/DLF.mp3', 'audio/mpeg'))
+        cancelled = threading.Event()
+        cancelled.set()
+        self.skill._play_playlist([self.station('DLF')], [resolved], cancelled)
+        self.assertEqual(self.recorder.events, [])
+
+
+class TestDownloadedPlayback(SkillTestCase):
+
+    def test_download_is_probed_without_another_request(self):
+        self.skill._needs_download = lambda media_url: True
+        self.skill.handle_play_request(self.station('VRT'))
+        self.assertEqual(CountingFeedHandler.paths, ['/audio/VRT.mp3'])
+        self.assertEqual(self.recorder.events[0][0], 'play')
+        self.assertTrue(self.recorder.events[0][1].startswith('file://'))
+
+
+class BlockingStation:
+    """Station whose resolution waits until released."""
+
+    def __init__(self, station):
+        self.station = station
+        self.resolving = threading.Event()
+        self.release = threading.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.station, name)
+
+    @property
+    def media_uri(self):
+        self.resolving.set()
+        self.release.wait(5)
+        return self.station.media_uri
+
+
+class TestStopDuringResolution(SkillTestCase):
+
+    def test_stopped_play_cannot_be_restarted(self):
+        station = BlockingStation(self.station('NPR'))
+        player = threading.Thread(target=self.skill.handle_play_request,
+                                  args=(station,))
+        player.start()
+        station.resolving.wait(5)
+        self.assertTrue(self.skill.stop())
+        station.release.set()
+        player.join(5)
+        self.assertNotIn(('play', station.media_uri), self.recorder.events)
+        self.assertIsNone(self.skill.last_station_played)
+        self.skill.enable_intent.assert_not_called()
+
+    def test_stopped_playlist_cannot_be_restarted(self):
+        station = BlockingStation(self.station('NPR'))
+        player = threading.Thread(target=self.skill.handle_playlist_request,
+                                  args=([station, self.station('BBC')],))
+        player.start()
+        station.resolving.wait(5)
+        self.assertTrue(self.skill.stop())
+        station.release.set()
+        player.join(5)
+        self.assertIsNone(self.skill.last_playlist_played)
+        self.skill.enable_intent.assert_not_called()
+
+    def test_completed_play_can_be_restarted(self):
+        station = self.station('NPR')
+        self.skill.handle_play_request(station)
+        self.assertIs(self.skill.last_station_played, station)
+        self.skill.enable_intent.assert_called_with('restart_playback')
+
+
+class TestStopDuringDownload(SkillTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.skill._needs_download = lambda media_url: True
+        download_media_file = self.skill.download_media_file
+
+        def download_then_stop(*args, **kwargs):
+            stream = download_media_file(*args, **kwargs)
+            self.skill.stop()
+            return stream
+
+        self.skill.download_media_file = download_then_stop
+
+    def test_stopped_play_is_not_started(self):
+        self.skill.handle_play_request(self.station('VRT'))
+        # Only the status reset sent by stop is reported
+        self.assertEqual(self.recorder.events, [('status', '')])
+        self.assertIsNone(self.skill.now_playing)
+        self.skill.enable_intent.assert_not_called()
+
+    def test_stopped_playlist_is_not_queued(self):
+        self.skill.handle_playlist_request([self.station('VRT'),
+                                            self.station('BBC')])
+        # Only the status reset sent by stop is reported
+        self.assertEqual(self.recorder.events, [('status', '')])
+        self.assertIsNone(self.skill.now_playing)
+        self.skill.enable_intent.assert_not_called()
+
+
+class TestSpeculativeResolution(SkillTestCase):
+
+    def setUp(self):
+        super().setUp()
+        registry = self.module.stations
+        for acronym in ('NPR', 'BBC'):
+            original = registry[acronym]
+            registry.set(acronym, self.station_module.RSSStation(
+                acronym, original.full_name, f'{self.base}/feed/{acronym}.xml'))
+            self.addCleanup(registry.set, acronym, original)
+
+    def query(self, phrase: str) -> dict:
+        """Match a phrase, waiting for any resolution it started."""
+        match = self.skill.CPS_match_query_phrase(phrase)
+        resolution = self.skill.speculative_resolution
+        if resolution is not None:
+            resolution.future.result(5)
+        return match[2]
+
+    def feed_fetches(self, acronym: str) -> int:
+        return CountingFeedHandler.paths.count(f'/feed/{acronym}.xml')
+
+    def test_query_starts_resolution(self):
+        self.query('NPR news')
+        resolution = self.skill.speculative_resolution
+        self.assertIs(resolution.station, self.module.stations['NPR'])
+        self.assertEqual(resolution.future.result(),
+                         (f'{self.base}/audio/NPR.mp3', 'audio/mpeg'))
+        self.assertEqual(self.feed_fetches('NPR'), 1)
+
+    def test_play_reuses_resolution(self):
+        self.skill.CPS_start(None, self.query('NPR news'))
+        self.assertIn(('play', f'{self.base}/audio/NPR.mp3'),
+                      self.recorder.events)
+        self.assertEqual(self.feed_fetches('NPR'), 1)
+        self.assertIsNone(self.skill.speculative_resolution)
+
+    def test_other_skill_starting_drops_resolution(self):
+        self.query('NPR news')
+        self.skill.handle_cps_play_start(
+            SimpleNamespace(data={'skill_id': 'other-skill'}))
+        self.assertIsNone(self.skill.speculative_resolution)
+
+    def test_own_start_keeps_resolution(self):
+        self.query('NPR news')
+        self.skill.handle_cps_play_start(
+            SimpleNamespace(data={'skill_id': self.skill.skill_id}))
+        self.assertIsNotNone(self.skill.speculative_resolution)
+
+    def test_expired_resolution_is_resolved_again(self):
+        data = self.query('NPR news')
+        with patch.object(self.module, 'SPECULATIVE_RESOLUTION_TTL', -1):
+            self.skill.CPS_start(None, data)
+        self.assertIn(('play', f'{self.base}/audio/NPR.mp3'),
+                      self.recorder.events)
+        self.assertEqual(self.feed_fetches('NPR'), 2)
+
+    def test_resolution_of_other_station_is_discarded(self):
+        self.query('NPR news')
+        self.skill.CPS_start(None, {'acronym': 'BBC'})
+        self.assertIn(('play', f'{self.base}/audio/BBC.mp3'),
+                      self.recorder.events)
+        self.assertNotIn(('play', f'{self.base}/audio/NPR.mp3'),
+                         self.recorder.events)
+        self.assertEqual(self.feed_fetches('BBC'), 1)
+        self.assertIsNone(self.skill.speculative_resolution)
+
+
+class TestProfilingSetting(SkillTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.skill.set_profiling = Mock()
+
+    def test_absent_setting_is_ignored(self):
+        self.skill.on_websettings_changed()
+        self.skill.set_profiling.assert_not_called()
+
+    def test_only_changes_are_applied(self):
+        self.skill.settings['profiling'] = True
+        self.skill.on_websettings_changed()
+        self.skill.on_websettings_changed()
+        self.skill.set_profiling.assert_called_once_with(True, None)
+        del self.skill.settings['profiling']
+        self.skill.on_websettings_changed()
+        self.skill.set_profiling.assert_called_with(False, None)
+
+
+class TestSettings(SkillTestCase):
+
+    def test_blank_number_uses_default(self):
+        self.skill.settings['parse_workers'] = ''
+        self.assertEqual(self.skill._get_int_setting('parse_workers'), 0)
+
+    def test_invalid_number_uses_default(self):
+        self.skill.settings['parse_workers'] = 'two'
+        self.assertEqual(self.skill._get_int_setting('parse_workers', 1), 1)
+
+    def test_number_given_as_text(self):
+        self.skill.settings['parse_workers'] = '2'
+        self.assertEqual(self.skill._get_int_setting('parse_workers'), 2)
+
+    def test_blank_settings_are_applied(self):
+        self.skill.settings.update(parse_workers='', min_bitrate_kbps='')
+        self.skill.on_websettings_changed()
+        policy = self.station_module.enclosure_policy
+        self.assertIsNone(policy.min_bitrate)
@@ -0,0 +1,167 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import requests
+
+from stations import station, util
+from stations.station import (
+    CustomStation,
+    FileStation,
+    RSSStation,
+    StationRegistry,
+    create_custom_station
+)
+from stations.util import known_mime_types, sniff_url
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Custom</title>
+<item><title>Latest</title>
+<enclosure url="https://example.com/latest.mp3" length="1024" type="audio/mpeg"/>
+</item></channel></rss>"""
+# ID3v2.4 tag followed by an MPEG 1 Layer III frame
+MP3 = b'ID3\x04\x00\x00\x00\x00\x00\x00' + b'\xff\xfb\x90\x64' + bytes(413)
+ERROR_PAGE = b'<html><body><h1>Not Found</h1></body></html>'
+
+DOCUMENTS = {
+    '/feed.xml': (200, 'application/rss+xml', FEED),
+    '/feed': (200, 'text/plain', FEED),
+    '/bulletin.mp3': (200, 'application/octet-stream', MP3),
+    '/missing.mp3': (404, 'text/html', ERROR_PAGE),
+}
+
+
+class DocumentServer(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    paths = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        DocumentServer.paths.append(self.path)
+        status, content_type, body = DOCUMENTS[self.path]
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SniffTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), DocumentServer)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        DocumentServer.paths = []
+        patches = [
+            patch.object(util, 'rate_limiter'),
+            patch.dict(known_mime_types, clear=True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+class TestSniffUrl(SniffTestCase):
+
+    def test_rss_feed(self):
+        sniffed = sniff_url(f'{self.base}/feed.xml')
+        self.assertTrue(sniffed.is_feed)
+        self.assertEqual(sniffed.body, FEED)
+
+    def test_feed_with_generic_content_type(self):
+        sniffed = sniff_url(f'{self.base}/feed')
+        self.assertTrue(sniffed.is_feed)
+        self.assertEqual(sniffed.body, FEED)
+
+    def test_audio_with_generic_content_type(self):
+        sniffed = sniff_url(f'{self.base}/bulletin.mp3')
+        self.assertFalse(sniffed.is_feed)
+        self.assertEqual(sniffed.mime, 'audio/mpeg')
+        self.assertIsNone(sniffed.body)
+
+    def test_html_error_page(self):
+        sniffed = sniff_url(f'{self.base}/missing.mp3')
+        self.assertFalse(sniffed.is_feed)
+        self.assertIsNone(sniffed.mime)
+        self.assertIsNone(sniffed.body)
+
+
+class TestCreateCustomStation(SniffTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.stations = StationRegistry()
+        registry = patch.object(station, 'stations', self.stations)
+        registry.start()
+        self.addCleanup(registry.stop)
+
+    def test_feed_is_seeded(self):
+        create_custom_station(f'{self.base}/feed.xml')
+        custom = self.stations['custom']
+        self.assertIsInstance(custom, RSSStation)
+        self.assertEqual(custom.media_uri, 'https://example.com/latest.mp3')
+        # The sniffed feed is played without fetching it again
+        self.assertEqual(DocumentServer.paths, ['/feed.xml'])
+        self.assertEqual(known_mime_types['https://example.com/latest.mp3'],
+                         'audio/mpeg')
+
+    def test_audio_file_is_seeded(self):
+        url = f'{self.base}/bulletin.mp3'
+        create_custom_station(url)
+        custom = self.stations['custom']
+        self.assertIsInstance(custom, FileStation)
+        self.assertEqual(custom.media_uri, url)
+        self.assertEqual(known_mime_types[url], 'audio/mpeg')
+
+    def test_error_page_is_not_seeded(self):
+        url = f'{self.base}/missing.mp3'
+        create_custom_station(url)
+        self.assertIsInstance(self.stations['custom'], FileStation)
+        self.assertNotIn(url, known_mime_types)
+
+    def test_unreachable_url_is_checked_on_play(self):
+        url = f'{self.base}/feed.xml'
+        with patch.object(station, 'sniff_url',
+                          side_effect=requests.ConnectionError):
+            create_custom_station(url)
+        custom = self.stations['custom']
+        self.assertIsInstance(custom, CustomStation)
+        self.assertEqual(custom.media_uri, 'https://example.com/latest.mp3')
+        # The feed sniffed on play is played without fetching it again
+        self.assertEqual(DocumentServer.paths, ['/feed.xml'])
+
+    def test_still_unreachable_url_is_checked_again(self):
+        url = f'{self.base}/bulletin.mp3'
+        with patch.object(station, 'sniff_url',
+                          side_effect=requests.ConnectionError):
+            create_custom_station(url)
+            with self.assertRaises(requests.RequestException):
+                self.stations['custom'].media_uri
+        self.assertEqual(self.stations['custom'].media_uri, url)
+        self.assertEqual(known_mime_types[url], 'audio/mpeg')
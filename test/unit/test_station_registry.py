@@ -0,0 +1,42 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from stations.station import FileStation, StationRegistry
+
+
+class TestStationRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.npr = FileStation('NPR', 'NPR News Now', 'https://npr.org/a.mp3')
+        self.custom = FileStation('custom', 'Your custom station',
+                                  'https://example.com/a.mp3')
+        self.registry = StationRegistry(NPR=self.npr)
+
+    def test_set_increments_version(self):
+        self.assertEqual(self.registry.version, 0)
+        self.registry.set('custom', self.custom)
+        self.assertEqual(self.registry.version, 1)
+        self.assertIs(self.registry['custom'], self.custom)
+
+    def test_snapshot_is_unchanged_by_later_writes(self):
+        snapshot = self.registry.snapshot()
+        self.registry.set('custom', self.custom)
+        self.assertNotIn('custom', snapshot)
+        self.assertEqual(list(snapshot.values()), [self.npr])
+
+    def test_snapshot_is_read_only(self):
+        with self.assertRaises(TypeError):
+            self.registry.snapshot()['custom'] = self.custom
@@ -0,0 +1,68 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Resolve every station against recorded HTTP exchanges.
+
+The fixtures in test/fixtures are minimal hand-written copies of each
+station's documents, with typical network times. They can be replaced by
+real recordings made with network access:
+
+    NEWS_SKILL_RECORD=1 python -m pytest test/unit/test_stations.py
+
+Exchanges are replayed with their recorded timing, so both the resolved url
+and the time taken can be checked without a network.
+"""
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from pytz import timezone
+
+from stations import rainews
+from stations.station import FileStation, stations
+from test.replay import FIXTURE_DIR, Cassette, default_mode
+
+# Seconds a station may take to resolve, including replayed network time
+RESOLUTION_BUDGET = 1.0
+
+# TSF urls depend on the current hour, this is the hour in its fixture
+TSF_TIME = timezone('Portugal').localize(datetime(2021, 6, 1, 12, 5))
+
+
+class TestStationResolution(unittest.TestCase):
+
+    def setUp(self):
+        rainews.programme_cache.clear()
+        rainews.episode_cache.clear()
+        now = patch('stations.tsf.now_local', return_value=TSF_TIME)
+        now.start()
+        self.addCleanup(now.stop)
+
+    def test_stations(self):
+        for acronym, station in stations.items():
+            if isinstance(station, FileStation):
+                continue
+            with self.subTest(station=acronym):
+                fixture = FIXTURE_DIR / f'{acronym}.json'
+                if default_mode(fixture) == 'replay' and not fixture.exists():
+                    self.skipTest(f'No recorded fixture for {acronym}')
+                with Cassette(fixture, scale=1.0):
+                    start = time.perf_counter()
+                    url = station.media_uri
+                    elapsed = time.perf_counter() - start
+                self.assertIsInstance(url, str)
+                self.assertTrue(url.startswith('http'))
+                self.assertTrue(url.endswith('.mp3'))
+                self.assertLess(elapsed, RESOLUTION_BUDGET)
@@ -0,0 +1,150 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from stations import util
+from stations.util import (
+    Coalescer,
+    TTLCache,
+    TokenBucket,
+    extract_json_value,
+    fetch
+)
+
+INDEX = """{
+    "title": "GR1",
+    "block": {
+        "name": "Episodi",
+        "cards": [
+            {"path_id": "/audio/latest.json", "image": {"path_id": "x"}},
+            {"path_id": "/audio/previous.json"}
+        ]
+    }
+}"""
+
+
+class TestExtractJsonValue(unittest.TestCase):
+
+    def test_first_array_item(self):
+        path = extract_json_value(INDEX, 'block', 'cards', 0, 'path_id')
+        self.assertEqual(path, '/audio/latest.json')
+
+    def test_nested_object(self):
+        block = extract_json_value(INDEX, 'block')
+        self.assertEqual(block['name'], 'Episodi')
+
+    def test_missing_key(self):
+        with self.assertRaises(KeyError):
+            extract_json_value(INDEX, 'missing')
+
+    def test_nested_key_before_own_key(self):
+        document = """{"block": {"cards": [
+            {"image": {"path_id": "/img/logo.png"}, "path_id": "/audio/latest.json"}
+        ]}, "path_id": "/programmi/gr1"}"""
+        path = extract_json_value(document, 'block', 'cards', 0, 'path_id')
+        self.assertEqual(path, '/audio/latest.json')
+        self.assertEqual(extract_json_value(document, 'path_id'), '/programmi/gr1')
+
+    def test_later_array_item(self):
+        path = extract_json_value(INDEX, 'block', 'cards', 1, 'path_id')
+        self.assertEqual(path, '/audio/previous.json')
+        with self.assertRaises(IndexError):
+            extract_json_value(INDEX, 'block', 'cards', 2)
+
+    def test_key_only_in_nested_object(self):
+        with self.assertRaises(KeyError):
+            extract_json_value('{"a": {"b": 1}, "c": 2}', 'b')
+
+    def test_invalid_document(self):
+        with self.assertRaises(ValueError):
+            extract_json_value('{"a" 1}', 'a')
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_value_reused_until_expired(self):
+        cache = TTLCache(ttl=60)
+        self.assertEqual(cache.get('key', lambda: 1), 1)
+        self.assertEqual(cache.get('key', lambda: 2), 1)
+        cache.ttl = 0
+        self.assertEqual(cache.get('key', lambda: 3), 3)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_steady_rate(self):
+        bucket = TokenBucket(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # Two requests in the burst, then two more at 20 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class TestCoalescer(unittest.TestCase):
+
+    def test_concurrent_calls_share_result(self):
+        coalescer = Coalescer()
+        calls = []
+        release = threading.Event()
+
+        def slow_call():
+            calls.append(1)
+            release.wait(1)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(coalescer.run('key', slow_call)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+
+    def test_later_calls_run_again(self):
+        coalescer = Coalescer()
+        self.assertEqual(coalescer.run('key', lambda: 1), 1)
+        self.assertEqual(coalescer.run('key', lambda: 2), 2)
+
+
+class TestFetch(unittest.TestCase):
+
+    def setUp(self):
+        patches = [patch.object(util, 'rate_limiter'),
+                   patch.object(util, 'session')]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_error_status_is_raised(self):
+        response = Mock(status_code=404, content=b'<html>Not Found</html>')
+        response.raise_for_status.side_effect = requests.HTTPError('404')
+        util.session.get.return_value = response
+        with self.assertRaises(requests.HTTPError):
+            fetch('https://example.com/missing.xml')
+
+    def test_body_is_returned(self):
+        util.session.get.return_value = Mock(status_code=200, content=b'<rss/>')
+        self.assertEqual(fetch('https://example.com/feed.xml'), b'<rss/>')
@@ -0,0 +1,46 @@
+# Copyright 2021 Mycroft AI Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import unittest
+
+from stations.station import FileStation
+from stations.vocabulary import Vocabulary
+
+
+class TestVocabulary(unittest.TestCase):
+
+    def setUp(self):
+        self.vocabulary = Vocabulary(
+            'en-us',
+            news_words=['news', 'headlines', 'latest news'],
+            news_phrases=['Play the News'],
+            news_keyword='News',
+            station_aliases={'AP': ['associated press']},
+        )
+
+    def test_contains_news(self):
+        self.assertTrue(self.vocabulary.contains_news("what's the news"))
+        self.assertTrue(self.vocabulary.contains_news('headlines please'))
+        self.assertFalse(self.vocabulary.contains_news('newsletter'))
+
+    def test_phrases_and_keyword_are_lowercase(self):
+        self.assertIn('play the news', self.vocabulary.news_phrases)
+        self.assertEqual(self.vocabulary.news_keyword, 'news')
+
+    def test_mention_pattern_includes_aliases(self):
+        station = FileStation('AP', 'AP Hourly Radio News', 'https://a.mp3')
+        pattern = self.vocabulary.mention_pattern(station)
+        self.assertEqual(
+            pattern.search('news from the associated press').start(), 14)
+        self.assertIsNone(pattern.search('what is happening'))